@@ -0,0 +1,150 @@
+"""
+Baked cycles of RingWeave, played back from memory mapped files.
+
+With whole nwaves the curve repeats every tau seconds of time, so one cycle
+of vertices at a chosen number of frames is enough to play it forever. A
+cycle is keyed by the attributes ringweave saves in its config, the size of
+its space and its tolerance. It is baked by a worker process, while the
+curve is computed live, whenever the key has no file yet.
+"""
+import contextlib
+import hashlib
+import math
+import multiprocessing
+import os
+
+from pathlib import Path
+
+with contextlib.redirect_stdout(open(os.devnull,'w')):
+    import pygame as pg
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# the attributes of ringweave's config
+ATTRS = ('base', 'closed', 'focus', 'nsteps', 'nwaves', 'somevar', 'spread')
+
+DTYPES = ('int16', 'float32')
+
+def add_arguments(parser):
+    group = parser.add_argument_group('bake')
+    group.add_argument('--bake', metavar='FRAMES', type=int, default=0,
+                       help='Play a cycle baked at FRAMES frames, baking it in the'
+                            ' background first, 0 to always compute live.'
+                            ' [%(default)s]')
+    group.add_argument('--bake-dir', metavar='DIR', default='ringweave-cache',
+                       help='Directory of the baked cycles. [%(default)s]')
+    group.add_argument('--bake-dtype', choices=DTYPES, default='int16',
+                       help='Type of the baked vertices. [%(default)s]')
+
+def from_args(args):
+    if not args.bake:
+        return None
+    return WeaveCache(args.bake_dir, args.bake, args.bake_dtype)
+
+def _bake(task):
+    # ringweave is imported here, it imports this module
+    import ringweave
+    attrs, size, tolerance, frames, dtype, path = task
+    weave = ringweave.ArrayRingWeave(pg.Rect((0, 0), size))
+    for attr, value in attrs.items():
+        setattr(weave, attr, value)
+    weave.tolerance = tolerance
+    nvertices = len(weave.get_points(0))
+    temp = path.with_suffix('.tmp')
+    cycle = np.lib.format.open_memmap(temp, mode='w+', dtype=dtype,
+                                      shape=(frames, nvertices, 2))
+    for frame in range(frames):
+        points = weave.get_points(frame * math.tau / frames)
+        if dtype == 'int16':
+            points = np.clip(np.rint(points), -32768, 32767)
+        cycle[frame] = points
+    cycle.flush()
+    del cycle
+    # the file appears complete or not at all
+    os.replace(temp, path)
+    return path
+
+
+class WeaveCache:
+    """
+    Cycles of `frames` frames of vertices of `dtype` in `directory`, looked
+    up by the attributes of a RingWeave. One cycle is baked at a time, and
+    when it is done the latest missing one is baked next.
+    """
+
+    def __init__(self, directory, frames=600, dtype='int16'):
+        if np is None:
+            raise RuntimeError('WeaveCache requires numpy')
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.frames = frames
+        self.dtype = dtype
+        self.key = None
+        self.cycle = None
+        self.pending = None
+        self.pool = None
+        self.bakes = 0
+
+    def path(self, key):
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()[:16]
+        return self.directory / f'ringweave-{digest}.npy'
+
+    def weave_key(self, weave):
+        return (tuple(getattr(weave, attr) for attr in ATTRS), weave.space.size,
+                weave.tolerance, self.frames, self.dtype)
+
+    def status(self):
+        if self.cycle is not None:
+            return 'baked'
+        return 'baking' if self.pending else 'live'
+
+    def lookup(self, weave, time):
+        """
+        Baked vertices of `weave` at `time` as a list of pairs, or None
+        while its cycle is not baked.
+        """
+        if weave.nwaves != int(weave.nwaves):
+            # not periodic in tau
+            return None
+        key = self.weave_key(weave)
+        if key != self.key:
+            # edited, load its cycle if it was ever baked
+            self.key = key
+            self.cycle = None
+            path = self.path(key)
+            if path.exists():
+                self.cycle = np.load(path, mmap_mode='r')
+        if self.pending and self.pending[1].ready():
+            baked, result = self.pending
+            self.pending = None
+            result.get()
+            self.bakes += 1
+            if baked == self.key:
+                self.cycle = np.load(self.path(baked), mmap_mode='r')
+        if self.cycle is None:
+            if self.pending is None:
+                self.bake(weave, key)
+            return None
+        frame = round(time % math.tau / math.tau * self.frames) % self.frames
+        # pg.draw reads a list many times faster than a memory mapped array
+        return self.cycle[frame].tolist()
+
+    def bake(self, weave, key):
+        if self.pool is None:
+            self.pool = multiprocessing.get_context('spawn').Pool(1)
+        attrs = dict(zip(ATTRS, key[0]))
+        task = (attrs, weave.space.size, weave.tolerance, self.frames, self.dtype,
+                self.path(key))
+        self.pending = (key, self.pool.apply_async(_bake, (task,)))
+
+    def close(self):
+        if self.pool:
+            self.pool.terminate()
+            self.pool.join()
+        if self.pending:
+            # the bake that was cut short
+            self.path(self.pending[0]).with_suffix('.tmp').unlink(missing_ok=True)
+            self.pending = None
@@ -0,0 +1,178 @@
+import argparse
+import contextlib
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+from pathlib import Path
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+with contextlib.redirect_stdout(open(os.devnull,'w')):
+    import pygame as pg
+
+import phases
+import scenes
+import tiles
+
+try:
+    import resource
+except ImportError:
+    # not available on windows
+    resource = None
+
+PERCENTILES = (50, 95, 99)
+
+def peak_rss_kib():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        # bytes on macos, kibibytes elsewhere
+        rss //= 1024
+    return rss
+
+def parse_assignment(string):
+    attr, _, value = string.partition('=')
+    if not attr or not value:
+        raise argparse.ArgumentTypeError(f'expected ATTR=VALUE, got {string!r}')
+    return (attr, float(value) if '.' in value or 'e' in value else int(value))
+
+def benchmark(name, screen, frames, warmup, dt, assignments=(), trace=False,
+              engine='python', workers=0):
+    """
+    Draw `frames` frames of a scene on a simulated clock, without a frame
+    cap, and return a dict of timings in milliseconds.
+    """
+    scene = scenes.make_scene(name, screen.get_size(), engine)
+    for attr, value in assignments:
+        if hasattr(scene.model, attr):
+            setattr(scene.model, attr, value)
+    renderer = None
+    if workers:
+        renderer = tiles.TileRenderer(name, screen.get_size(), workers, engine)
+        scene = scene._replace(
+            draw = lambda surf, time: renderer.draw(surf, scene.model, time))
+
+    simulated = 0
+    for _ in range(warmup):
+        screen.fill((0,0,0))
+        scene.draw(screen, simulated)
+        simulated += dt
+
+    if trace:
+        tracemalloc.start()
+    draw_times = []
+    start = time.perf_counter()
+    for _ in range(frames):
+        screen.fill((0,0,0))
+        before = time.perf_counter()
+        scene.draw(screen, simulated)
+        draw_times.append((time.perf_counter() - before) * 1000)
+        pg.display.flip()
+        simulated += dt
+    elapsed = time.perf_counter() - start
+    if renderer:
+        renderer.close()
+    if trace:
+        _, traced_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    else:
+        traced_peak = None
+
+    draw_times.sort()
+    result = {
+        'scene': name,
+        'model': type(scene.model).__name__,
+        'workers': workers,
+        'frames': frames,
+        'size': list(screen.get_size()),
+        'fps': frames / elapsed,
+        'draw_mean_ms': statistics.fmean(draw_times),
+    }
+    for p in PERCENTILES:
+        result[f'draw_p{p}_ms'] = phases.percentile(draw_times, p)
+    if renderer:
+        result['tile_mean_ms'] = renderer.mean_timings()
+    result['peak_rss_kib'] = peak_rss_kib()
+    result['traced_peak_kib'] = traced_peak // 1024 if traced_peak is not None else None
+    return result
+
+def format_table(results):
+    columns = ['scene', 'model', 'workers', 'fps', 'draw_mean_ms']
+    columns.extend(f'draw_p{p}_ms' for p in PERCENTILES)
+    columns.extend(['peak_rss_kib', 'traced_peak_kib'])
+    rows = [columns]
+    for result in results:
+        row = []
+        for column in columns:
+            value = result[column]
+            if isinstance(value, float):
+                value = f'{value:.2f}'
+            elif value is None:
+                value = '-'
+            row.append(str(value))
+        rows.append(row)
+    widths = [max(len(row[i]) for row in rows) for i in range(len(columns))]
+    lines = []
+    for row in rows:
+        lines.append('  '.join(cell.rjust(width) for cell, width in zip(row, widths)))
+    lines.insert(1, '  '.join('-' * width for width in widths))
+    return '\n'.join(lines)
+
+def main(argv=None):
+    """
+    Headless frame time benchmark of the demos.
+    """
+    parser = argparse.ArgumentParser(prog=Path(__file__).stem, description=main.__doc__)
+    parser.add_argument('scenes', nargs='*', metavar='scene',
+                        help=f'Scenes to benchmark, of {", ".join(scenes.SCENES)}. [all]')
+    parser.add_argument('--xres', type=int, default=800,
+                        help='Horizontal resolution. [%(default)s]')
+    parser.add_argument('--yres', type=int, default=600,
+                        help='Vertical resolution. [%(default)s]')
+    parser.add_argument('--frames', type=int, default=300,
+                        help='Number of timed frames. [%(default)s]')
+    parser.add_argument('--warmup', type=int, default=10,
+                        help='Number of untimed frames first. [%(default)s]')
+    parser.add_argument('--dt', type=float, default=1/60,
+                        help='Simulated seconds per frame. [%(default).4f]')
+    parser.add_argument('--set', dest='assignments', type=parse_assignment,
+                        action='append', default=[], metavar='ATTR=VALUE',
+                        help='Set an attribute on every scene that has it.')
+    parser.add_argument('--engine', choices=['python', 'numpy'], default='python',
+                        help='Array engine for scenes that have it. [%(default)s]')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='Rasterize in bands across worker processes. [%(default)s]')
+    parser.add_argument('--tracemalloc', action='store_true',
+                        help='Trace peak Python allocations (slows frames).')
+    parser.add_argument('--json', help='Write results as JSON to file, "-" for stdout.')
+    args = parser.parse_args(argv)
+
+    names = args.scenes or list(scenes.SCENES)
+    for name in names:
+        if name not in scenes.SCENES:
+            parser.error(f'unknown scene {name!r}')
+    pg.init()
+    screen = pg.display.set_mode((args.xres, args.yres))
+    results = []
+    for name in names:
+        results.append(benchmark(name, screen, args.frames, args.warmup,
+                                 args.dt, args.assignments, args.tracemalloc,
+                                 args.engine, args.workers))
+    pg.quit()
+
+    if args.json == '-':
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    else:
+        print(format_table(results))
+        if args.json:
+            with open(args.json, 'w') as json_file:
+                json.dump(results, json_file, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -3,73 +3,158 @@ import collections
 import contextlib
 import itertools
 import math
+import multiprocessing
 import os
 import random
+import signal
+import time
 
 from pathlib import Path
 
 with contextlib.redirect_stdout(open(os.devnull, 'w')):
     import pygame as pg
 
-class Clock:
+import engine
+import export
+import hud
 
-    def __init__(self, framerate):
-        self.framerate = framerate
-        self._clock = pg.time.Clock()
+# state of a shatter worker process, set by _init_worker
+_worker = {}
+
+def _init_worker(fontsize):
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    pg.init()
+    # pg.init traps SIGTERM, which the pool terminates its workers with
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    _worker['font'] = hud.font(fontsize)
+
+def shatter(font, color, seed):
+    """
+    Return the text image in `color` and its broken image, broken with
+    random seeded by `seed`, leaving the state of random as it was.
+    """
+    state = random.getstate()
+    random.seed(seed)
+    try:
+        textimage = font.render('BROKEN', True, color)
+        return textimage, breakimage(textimage)
+    finally:
+        random.setstate(state)
+
+def _shatter(task):
+    textimage, broken = shatter(_worker['font'], *task)
+    return (textimage.get_size(), pg.image.tobytes(textimage, 'RGBA'),
+            pg.image.tobytes(broken, 'RGBA'))
 
-    def tick(self):
-        self._clock.tick(self.framerate)
 
+class ShatterPool:
+    """
+    Worker processes that shatter the images of upcoming colors ahead of
+    time, keeping up to `depth` of them queued as raw RGBA buffers.
+    """
+
+    def __init__(self, next_color, fontsize, workers=2, depth=4):
+        self.next_color = next_color
+        self.font = hud.font(fontsize)
+        self.depth = depth
+        context = multiprocessing.get_context('spawn')
+        self.pool = context.Pool(workers, _init_worker, (fontsize,))
+        self.pending = collections.deque()
+        self.requests = 0
+        self.misses = 0
+        self.miss_ms = 0
+        self.fill()
 
-class Engine:
+    def fill(self):
+        while len(self.pending) < self.depth:
+            # seeded here, in order, so the shards do not depend on which
+            # worker takes the task
+            task = (self.next_color(), random.getrandbits(32))
+            self.pending.append((task, self.pool.apply_async(_shatter, (task,))))
 
-    def __init__(self, clock, screen, state):
-        self.clock = clock
-        self.screen = screen
-        self.state = state
+    def ready(self):
+        """
+        Number of queued images that are done.
+        """
+        return sum(result.ready() for _, result in self.pending)
 
-    def run(self):
-        running = True
-        while running:
-            ms = self.clock.tick()
-            for event in pg.event.get():
-                if event.type == pg.QUIT:
-                    running = False
-                else:
-                    self.state.handle(event)
-            self.state.update(ms)
-            self.screen.fill((0,0,0))
-            self.state.draw(self.screen)
-            pg.display.flip()
+    def get(self):
+        """
+        Return the next text image and its broken image. When the workers
+        are not done with it, which counts as a miss, it is shattered here
+        from the same task, with the same result.
+        """
+        task, result = self.pending.popleft()
+        self.requests += 1
+        if result.ready():
+            size, text, broken = result.get()
+            images = (pg.image.frombytes(text, size, 'RGBA'),
+                      pg.image.frombytes(broken, size, 'RGBA'))
+        else:
+            self.misses += 1
+            start = time.perf_counter()
+            images = shatter(self.font, *task)
+            self.miss_ms += (time.perf_counter() - start) * 1000
+        self.fill()
+        return images
+
+    def report(self):
+        return (f'shatter pool: {self.requests} requests, {self.misses} misses,'
+                f' {self.miss_ms:.1f} ms shattering misses')
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
 
 
 class BreakingBroke:
 
-    def __init__(self):
-        self.font = pg.font.Font(None, 200)
+    def __init__(self, workers=0, depth=4):
+        self.font = hud.font(200)
         self.colors = list(itertools.permutations((10,10,200)))
         self.colors.extend(itertools.permutations((10,200,200)))
         self.shuffle_colors()
+        self.pool = None
+        self.pool_table = None
+        if workers:
+            self.pool = ShatterPool(self.next_color, 200, workers, depth)
+            self.pool_table = hud.Table(hud.TextCache(), 24, (200, 200, 200),
+                                        volatile=('ready',))
         self.init_broken()
 
     def shuffle_colors(self):
         random.shuffle(self.colors)
         self.colors_queue = collections.deque(self.colors)
 
-    def init_broken(self):
+    def next_color(self):
         if not self.colors_queue:
             self.shuffle_colors()
-        self.textimage = self.font.render('BROKEN', True, self.colors_queue.popleft())
-        self.broken = breakimage(self.textimage)
+        return self.colors_queue.popleft()
+
+    def init_broken(self):
+        if self.pool:
+            self.textimage, self.broken = self.pool.get()
+        else:
+            self.textimage = self.font.render('BROKEN', True, self.next_color())
+            self.broken = breakimage(self.textimage)
 
     def draw(self, surf):
         rect = self.textimage.get_rect()
         surf.blit(self.textimage, rect)
         pg.draw.rect(surf, (200, 10, 10), rect, 1)
 
-        rect = self.broken.get_rect(topleft = rect.bottomleft)
-        surf.blit(self.broken, rect)
-        pg.draw.rect(surf, (200, 10, 10), rect, 1)
+        broken_rect = self.broken.get_rect(topleft = rect.bottomleft)
+        surf.blit(self.broken, broken_rect)
+        pg.draw.rect(surf, (200, 10, 10), broken_rect, 1)
+        drawn = [rect, broken_rect]
+        if self.pool:
+            self.pool_table.update([
+                ('ready', f'{self.pool.ready()}/{self.pool.depth}'),
+                ('misses', f'{self.pool.misses}/{self.pool.requests}'),
+                ('miss ms', f'{self.pool.miss_ms:.1f}')])
+            space = surf.get_rect()
+            drawn.append(self.pool_table.draw(surf, bottomright=space.bottomright))
+        return drawn
 
     def handle(self, event):
         if event.type == pg.KEYDOWN:
@@ -78,17 +163,20 @@ class BreakingBroke:
             elif event.key == pg.K_SPACE:
                 self.init_broken()
 
-    def update(self, ms):
+    def update(self, ms, keys):
         pass
 
 
 def breakmasks(size, arcmin=5, arcmax=20):
     """
-    Generate random image masks of rays from center.
+    Generate random image masks of rays from center, as (mask, rect) pairs
+    where the mask covers `rect` of the image. The masks share one surface
+    and are only valid until the next one is generated.
     """
     rect = pg.Rect((0, 0), size)
     length = max(size) * 2
     color = (255, 255, 255)
+    masks = pg.Surface(size, pg.SRCALPHA)
     start = end = 0
     while end != 360:
         end = random.choice(range(start + arcmin, start + arcmax))
@@ -103,25 +191,32 @@ def breakmasks(size, arcmin=5, arcmax=20):
             (rect.centerx + math.cos(end_radians) * length,
              rect.centery - math.sin(end_radians) * length)
         )
-        mask = pg.Surface(size, pg.SRCALPHA)
-        pg.draw.polygon(mask, color, points, 0)
-        yield mask
+        # draw.polygon returns the bounding rect of the pixels it drew,
+        # clipped to the image.
+        bounds = pg.draw.polygon(masks, color, points, 0)
+        yield (masks.subsurface(bounds), bounds)
+        masks.fill((0, 0, 0, 0), bounds)
         start = end
 
-def breakimage(source, shake=5):
+def breakshards(source, shake=5):
     """
-    Return a "broken" image of the source.
+    Generate the pieces of a "broken" image of the source as (shard, offset)
+    pairs, each shard only as large as its wedge.
     """
     flags = pg.BLEND_RGBA_MULT
-    size = source.get_size()
-    result = pg.Surface(size, pg.SRCALPHA)
-    masks = breakmasks(size)
-    for mask in masks:
-        temp = pg.Surface(size, pg.SRCALPHA)
+    for mask, rect in breakmasks(source.get_size()):
+        shard = pg.Surface(rect.size, pg.SRCALPHA)
         pos = (random.choice(range(-shake, shake+1)), random.choice(range(-shake, shake+1)))
-        temp.blit(source, pos)
-        temp.blit(mask, (0, 0), special_flags=flags)
-        result.blit(temp, (0, 0))
+        shard.blit(source, (pos[0] - rect.x, pos[1] - rect.y))
+        shard.blit(mask, (0, 0), special_flags=flags)
+        yield (shard, rect.topleft)
+
+def breakimage(source, shake=5):
+    """
+    Return a "broken" image of the source.
+    """
+    result = pg.Surface(source.get_size(), pg.SRCALPHA)
+    result.blits(breakshards(source, shake), doreturn=False)
     return result
 
 def main(argv=None):
@@ -137,15 +232,26 @@ def main(argv=None):
     parser.add_argument('--yres', type=int, default=600,
                         help='Vertical resolution. [%(default)s]')
     parser.add_argument('--fps', type=int, default=60,
-                        help='Frames per second. [%(default)s]')
+                        help='Frames per second, 0 for no limit. [%(default)s]')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='Shatter upcoming images in worker processes, 0 to'
+                             ' shatter on SPACE. [%(default)s]')
+    parser.add_argument('--depth', type=int, default=4,
+                        help='Images the workers keep ready. [%(default)s]')
+    engine.add_arguments(parser)
+    export.add_arguments(parser)
     args = parser.parse_args(argv)
     size = (args.xres, args.yres)
-    pg.init()
-    clock = Clock(args.fps)
-    screen = pg.display.set_mode(size)
-    breakingbroke = BreakingBroke()
-    engine = Engine(clock, screen, breakingbroke)
-    engine.run()
+    if args.export:
+        export.export('breaking_broke', size, args)
+        return
+    clock = engine.init(args)
+    screen = engine.set_mode(args, size)
+    breakingbroke = BreakingBroke(args.workers, args.depth)
+    engine.Engine.from_args(args, clock, screen, breakingbroke).run()
+    if breakingbroke.pool:
+        breakingbroke.pool.close()
+        print(breakingbroke.pool.report())
 
 if __name__ == '__main__':
     main()
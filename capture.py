@@ -0,0 +1,193 @@
+"""
+Live capture of the presented frames to a stream or a memory mapped file.
+
+Frames are copied through the screen's buffer into a ring of preallocated
+buffers and written out by a background thread. When the ring is full the
+frame is dropped and counted, so a slow consumer never stalls the demo.
+
+Frames are raw pixels in the screen's own format, rows of pitch bytes. For
+the usual 32 bit screen that is bgr0 to ffmpeg, for example:
+
+    python miniblackhole.py --capture - | ffmpeg -f rawvideo -pix_fmt bgr0 \\
+        -s 800x600 -r 60 -i - out.mp4
+"""
+import collections
+import contextlib
+import mmap
+import os
+import struct
+import sys
+import threading
+
+# magic, width, height, pitch, slots, then the number of the last frame written
+MMAP_HEADER = struct.Struct('<4sIIIIQ')
+MMAP_MAGIC = b'PGCF'
+
+# seconds closing waits for the writer to finish the buffered frames
+CLOSE_TIMEOUT = 5
+
+def add_arguments(parser):
+    group = parser.add_argument_group('capture')
+    group.add_argument('--capture', metavar='PATH',
+                       help='Stream presented frames to PATH, a file or FIFO, or - for'
+                            ' stdout.')
+    group.add_argument('--capture-mmap', metavar='PATH',
+                       help='Write presented frames into a ring of slots in a memory'
+                            ' mapped file at PATH.')
+    group.add_argument('--capture-ring', type=int, default=8,
+                       help='Frames buffered before frames are dropped. [%(default)s]')
+    group.add_argument('--capture-slots', type=int, default=4,
+                       help='Frame slots in the memory mapped file. [%(default)s]')
+
+def from_args(args, screen):
+    if args.capture:
+        return Capture(screen, StreamSink(args.capture), args.capture_ring)
+    if args.capture_mmap:
+        return Capture(screen, MmapSink(args.capture_mmap, screen, args.capture_slots),
+                       args.capture_ring)
+    return None
+
+def pixel_format(surf):
+    """
+    Name of the pixel format of `surf` as ffmpeg knows it, or None.
+    """
+    if surf.get_bytesize() != 4:
+        return None
+    names = {0xff0000: 'bgr', 0xff: 'rgb'}
+    name = names.get(surf.get_masks()[0])
+    if name is None:
+        return None
+    return name + ('a' if surf.get_masks()[3] else '0')
+
+
+class StreamSink:
+    """
+    Frames written one after another to a file, a FIFO or stdout. The path
+    is opened by the writer thread, since opening a FIFO waits for a reader.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        if path == '-':
+            # the frames get the real stdout, prints go to stderr
+            self.file = os.fdopen(os.dup(sys.stdout.fileno()), 'wb')
+            sys.stdout.flush()
+            os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+    def write(self, number, frame):
+        if self.file is None:
+            self.file = open(self.path, 'wb')
+        self.file.write(frame)
+
+    def close(self):
+        if self.file is not None:
+            with contextlib.suppress(BrokenPipeError):
+                self.file.close()
+
+
+class MmapSink:
+    """
+    Frames written to `slots` slots of a memory mapped file, frame number
+    modulo slots, with the number of the last frame in the header.
+    """
+
+    def __init__(self, path, screen, slots):
+        self.slots = slots
+        self.frame_size = screen.get_pitch() * screen.get_height()
+        size = MMAP_HEADER.size + slots * self.frame_size
+        with open(path, 'w+b') as mmap_file:
+            mmap_file.truncate(size)
+            self.map = mmap.mmap(mmap_file.fileno(), size)
+        MMAP_HEADER.pack_into(self.map, 0, MMAP_MAGIC, screen.get_width(),
+                              screen.get_height(), screen.get_pitch(), slots, 0)
+
+    def write(self, number, frame):
+        offset = MMAP_HEADER.size + (number % self.slots) * self.frame_size
+        self.map[offset:offset + self.frame_size] = frame
+        # the frame is complete before its number is published
+        struct.pack_into('<Q', self.map, MMAP_HEADER.size - 8, number)
+
+    def close(self):
+        self.map.close()
+
+
+class Capture:
+    """
+    Copy every presented frame into a ring of `ring` buffers that a writer
+    thread drains into `sink`, dropping frames when the ring is full.
+    """
+
+    def __init__(self, screen, sink, ring=8):
+        self.screen = screen
+        self.sink = sink
+        frame_size = screen.get_pitch() * screen.get_height()
+        self.free = collections.deque(bytearray(frame_size) for _ in range(ring))
+        self.filled = collections.deque()
+        self.condition = threading.Condition()
+        self.frames = 0
+        self.written = 0
+        self.dropped = 0
+        self.error = None
+        self.closing = False
+        self.thread = threading.Thread(target=self._write, daemon=True)
+        self.thread.start()
+
+    def capture(self):
+        """
+        Copy the screen into a free buffer, or drop the frame when there is
+        none.
+        """
+        self.frames += 1
+        with self.condition:
+            if not self.free or self.error:
+                self.dropped += 1
+                return
+            frame = self.free.popleft()
+        # the buffer proxy locks the screen until it is released
+        view = memoryview(self.screen.get_buffer())
+        frame[:] = view.cast('B')
+        view.release()
+        with self.condition:
+            self.filled.append((self.frames, frame))
+            self.condition.notify()
+
+    def _write(self):
+        while True:
+            with self.condition:
+                while not self.filled and not self.closing:
+                    self.condition.wait()
+                if not self.filled:
+                    return
+                number, frame = self.filled.popleft()
+            try:
+                self.sink.write(number, frame)
+                self.written += 1
+            except OSError as error:
+                # the consumer went away, drop everything from here on
+                self.error = error
+            with self.condition:
+                self.free.append(frame)
+
+    def report(self):
+        return (f'captured {self.written} of {self.frames} frames, dropped {self.dropped}'
+                f' ({pixel_format(self.screen) or "native"}'
+                f' {self.screen.get_pitch() // max(self.screen.get_bytesize(), 1)}'
+                f'x{self.screen.get_height()})')
+
+    def close(self):
+        with self.condition:
+            self.closing = True
+            self.condition.notify()
+        self.thread.join(CLOSE_TIMEOUT)
+        if self.thread.is_alive():
+            # blocked, like opening a FIFO that no one reads, it is left to
+            # die with the process
+            with self.condition:
+                self.filled.clear()
+                self.dropped = self.frames - self.written
+            print(f'capture writer blocked for {CLOSE_TIMEOUT}s, dropping the'
+                  ' frames it had not written', file=sys.stderr)
+        else:
+            self.sink.close()
+        print(self.report(), file=sys.stderr)
@@ -0,0 +1,333 @@
+"""
+Shared main loop of the demos.
+
+A state handles events with ``handle(event)``, advances with
+``update(ms, keys)`` and draws with ``draw(surf)``, which returns the rects
+it drew, or None for the whole surface.
+
+A state with a ``scale`` attribute that is not None can be drawn at a
+lower resolution, into a smaller surface that is upscaled to the screen,
+with its coordinates multiplied by ``scale``. Its HUD is drawn at the full
+resolution by an optional ``draw_hud(surf)``, which returns the rects it
+drew.
+"""
+import collections
+import contextlib
+import os
+import time
+
+with contextlib.redirect_stdout(open(os.devnull,'w')):
+    import pygame as pg
+
+import capture
+import hud
+import pacing
+import phases
+import present
+import quality
+import record
+
+# Keyboard snapshot for a frame, from pg.key.get_pressed and pg.key.get_mods.
+KeyState = collections.namedtuple('KeyState', 'pressed mods')
+
+def add_arguments(parser):
+    group = parser.add_argument_group('engine')
+    group.add_argument('--timestep', type=float, default=0,
+                       help='Update in fixed steps of milliseconds, 0 for once'
+                            ' per frame. [%(default)s]')
+    group.add_argument('--dirty', action='store_true',
+                       help='Present only changed rects.')
+    group.add_argument('--render-scale', type=float, default=1,
+                       help='Draw the scene at this fraction of the resolution and'
+                            ' upscale it, the HUD stays at full resolution.'
+                            ' [%(default)s]')
+    group.add_argument('--render-scale-min', type=float,
+                       help='With --quality, let adaptive quality lower the render'
+                            ' scale down to this.')
+    group.add_argument('--smooth', action='store_true',
+                       help='Upscale with smoothscale instead of nearest pixels.')
+    pacing.add_arguments(parser)
+    phases.add_arguments(parser)
+    record.add_arguments(parser)
+    capture.add_arguments(parser)
+
+def init(args):
+    """
+    Init pygame and return the clock of the frames, which replays a
+    recording without a window, or records, when asked.
+    """
+    if args.replay:
+        os.environ['SDL_VIDEODRIVER'] = 'dummy'
+        pg.init()
+        return record.Replay(args.replay)
+    pg.init()
+    if args.pacing == 'tick':
+        clock = Clock(args.fps)
+    else:
+        clock = pacing.from_args(args)
+    if args.record:
+        clock = record.Recorder(clock, args.record)
+    return clock
+
+def set_mode(args, size):
+    """
+    Open the window of `size`, with vsync for the vsync pacing.
+    """
+    return pacing.set_mode(size, vsync=args.pacing == 'vsync' and not args.replay)
+
+
+class Clock:
+    """
+    Frame clock that limits to `framerate`, or not at all when it is zero,
+    and returns the precise milliseconds since the last tick.
+    """
+
+    def __init__(self, framerate):
+        self.framerate = framerate
+        self._clock = pg.time.Clock()
+        self._last = None
+
+    def tick(self):
+        self._clock.tick(self.framerate)
+        now = time.perf_counter()
+        ms = 0 if self._last is None else (now - self._last) * 1000
+        self._last = now
+        return ms
+
+    def get_fps(self):
+        return self._clock.get_fps()
+
+
+class SimulatedClock:
+    """
+    Clock for headless stepping that advances `ms` every tick without
+    waiting.
+    """
+
+    def __init__(self, ms):
+        self.ms = ms
+
+    def tick(self):
+        return self.ms
+
+    def get_fps(self):
+        return 1000 / self.ms
+
+
+class Engine:
+    """
+    Run a state with variable rate draws, and with fixed `timestep` updates
+    when it is given.
+    """
+
+    # most updates per frame, before the simulation is allowed to fall behind
+    max_updates = 5
+
+    def __init__(self, clock, screen, state, presenter=None, timestep=None,
+                 background=(0,0,0), quality=None, profiler=None, graph=False,
+                 capture=None, render_scale=1, smooth=False, pacing_stats=None):
+        self.clock = clock
+        self.screen = screen
+        self.state = state
+        self.presenter = presenter
+        self.timestep = timestep
+        self.background = background
+        self.quality = quality
+        self.capture = capture
+        self.pacing_stats = pacing_stats
+        # perf_counter time of the last present
+        self.presented = None
+        self.render_scale = render_scale
+        self.smooth = smooth
+        # the surface scaled states are drawn into, at the render scale
+        self.canvas = None
+        self.accumulator = 0
+        self.running = True
+        self.quality_table = None
+        self.profiler = profiler
+        self.graph = None
+        self.graph_shown = False
+        if profiler:
+            phases.active = profiler
+            self.graph_shown = graph
+
+    @classmethod
+    def from_args(cls, args, clock, screen, state, background=(0,0,0), knobs=()):
+        """
+        Engine from the parsed engine arguments, with adaptive quality over
+        `knobs`, and over the render scale when it has a minimum, when it is
+        enabled.
+        """
+        presenter = None
+        if args.dirty:
+            presenter = present.DirtyPresenter(screen, background)
+        pacing_stats = None
+        if args.pacing_stats:
+            pacing_stats = pacing.PacingStats(args.pacing, args.fps)
+        self = cls(clock, screen, state, presenter, args.timestep or None, background,
+                   None, phases.Profiler.from_args(args), args.graph,
+                   capture.from_args(args, screen), args.render_scale, args.smooth,
+                   pacing_stats)
+        knobs = list(knobs)
+        if args.render_scale_min is not None and args.render_scale_min < args.render_scale:
+            knobs.append(quality.Knob(self, 'render_scale', args.render_scale_min,
+                                      args.render_scale, cast=float))
+        if knobs and getattr(args, 'quality', False):
+            self.quality = quality.from_args(args, knobs)
+        return self
+
+    def poll(self):
+        if hasattr(self.clock, 'poll'):
+            # recording or replaying
+            events, (pressed, mods) = self.clock.poll()
+        else:
+            events = pg.event.get()
+            pressed, mods = pg.key.get_pressed(), pg.key.get_mods()
+        for event in events:
+            if event.type == pg.QUIT:
+                self.running = False
+            elif event.type == pg.KEYDOWN and event.key == pg.K_F3 and self.profiler:
+                self.graph_shown = not self.graph_shown
+            else:
+                self.state.handle(event)
+        return KeyState(pressed, mods)
+
+    def update(self, ms, keys):
+        if not self.timestep:
+            with phases.phase('update'):
+                self.state.update(ms, keys)
+            return
+        self.accumulator += ms
+        updates = 0
+        while self.accumulator >= self.timestep and updates < self.max_updates:
+            with phases.phase('update'):
+                self.state.update(self.timestep, keys)
+            self.accumulator -= self.timestep
+            updates += 1
+        if updates == self.max_updates:
+            self.accumulator = min(self.accumulator, self.timestep)
+
+    def draw_quality(self):
+        if self.quality_table is None:
+            fontsize = max(self.screen.get_height() // 30, 12)
+            self.quality_table = hud.Table(hud.TextCache(), fontsize, (200, 200, 200),
+                                           volatile=('quality',))
+        self.quality_table.update([('quality', self.quality.label())])
+        return self.quality_table.draw(self.screen,
+                                       bottomleft=self.screen.get_rect().bottomleft)
+
+    def draw_graph(self):
+        if self.graph is None:
+            framerate = getattr(self.clock, 'framerate', 0)
+            self.graph = phases.Graph(budget=1000 / framerate if framerate else None)
+        return self.graph.draw(self.screen, self.profiler, topleft=(0, 0))
+
+    def draw_overlays(self):
+        rects = []
+        with phases.phase('hud'):
+            if hasattr(self.state, 'draw_hud'):
+                rects.extend(self.state.draw_hud(self.screen))
+            if self.quality:
+                rects.append(self.draw_quality())
+            if self.graph_shown:
+                rects.append(self.draw_graph())
+        return rects
+
+    def draw_scene(self, erase):
+        """
+        Draw the state, into the canvas and upscaled to the screen when it
+        can be drawn below full resolution, filling the background first
+        when `erase` is true or the canvas is drawn. Return the rects drawn.
+        """
+        scale = getattr(self.state, 'scale', None)
+        if scale is not None:
+            scale = self.state.scale = min(self.render_scale, 1)
+        if scale is None or scale == 1:
+            if erase and self.background is not None:
+                self.screen.fill(self.background)
+            return self.state.draw(self.screen)
+        width, height = self.screen.get_size()
+        size = (max(int(width * scale), 1), max(int(height * scale), 1))
+        if self.canvas is None or self.canvas.get_size() != size:
+            self.canvas = pg.Surface(size, 0, self.screen)
+        if self.background is not None:
+            self.canvas.fill(self.background)
+        self.state.draw(self.canvas)
+        if self.smooth:
+            pg.transform.smoothscale(self.canvas, (width, height), self.screen)
+        else:
+            pg.transform.scale(self.canvas, (width, height), self.screen)
+        # the upscale covers the whole screen
+        return None
+
+    def draw(self):
+        if self.presenter:
+            with phases.phase('draw'):
+                self.presenter.clear()
+                self.presenter.add(self.draw_scene(False))
+            self.presenter.add(self.draw_overlays())
+            with phases.phase('present'):
+                self.presenter.present()
+                self.presented = time.perf_counter()
+                if self.capture:
+                    self.capture.capture()
+        else:
+            with phases.phase('draw'):
+                self.draw_scene(True)
+            self.draw_overlays()
+            with phases.phase('present'):
+                pg.display.flip()
+                self.presented = time.perf_counter()
+                if self.capture:
+                    self.capture.capture()
+
+    def step(self, ms):
+        """
+        Run one frame that advances `ms` milliseconds.
+        """
+        start = time.perf_counter()
+        if self.profiler:
+            self.profiler.begin_frame()
+        with phases.phase('events'):
+            polled = time.perf_counter()
+            keys = self.poll()
+        self.update(ms, keys)
+        self.draw()
+        if self.pacing_stats:
+            self.pacing_stats.frame(polled, self.presented)
+        if self.profiler:
+            self.profiler.end_frame()
+        if self.quality:
+            self.quality.record((time.perf_counter() - start) * 1000)
+
+    def run(self, frames=None):
+        """
+        Run until quit, or for `frames` frames, or until the clock has no
+        more frames.
+        """
+        while self.running and frames != 0:
+            ms = self.clock.tick()
+            if ms is None:
+                self.running = False
+                break
+            self.step(ms)
+            if frames is not None:
+                frames -= 1
+        if not self.running:
+            self.close()
+
+    def close(self):
+        """
+        Finish the trace, the cProfile report, any recording or replay and
+        the capture.
+        """
+        if hasattr(self.clock, 'close'):
+            self.clock.close()
+        if self.capture:
+            self.capture.close()
+        if self.pacing_stats:
+            print(self.pacing_stats.report())
+        if self.profiler:
+            self.profiler.close()
+            if phases.active is self.profiler:
+                phases.active = None
@@ -0,0 +1,98 @@
+"""
+Offline frame export of the demos, rendered in parallel with a
+deterministic time per frame.
+"""
+import contextlib
+import multiprocessing
+import os
+import random
+import signal
+import time
+
+from pathlib import Path
+
+with contextlib.redirect_stdout(open(os.devnull,'w')):
+    import pygame as pg
+
+import scenes
+
+FORMATS = ('png', 'rgb')
+
+# state of a worker process, set by _init_worker
+_worker = {}
+
+def add_arguments(parser):
+    group = parser.add_argument_group('export')
+    group.add_argument('--export', metavar='DIR',
+                       help='Render frames offline into DIR instead of running.')
+    group.add_argument('--frames', type=int, default=60,
+                       help='Number of frames to export. [%(default)s]')
+    group.add_argument('--start', type=float, default=0,
+                       help='Time of the first frame in seconds. [%(default)s]')
+    group.add_argument('--dt', type=float, default=1/60,
+                       help='Seconds between frames. [%(default).4f]')
+    group.add_argument('--format', choices=FORMATS, default='png',
+                       help='PNG files or one raw RGB stream. [%(default)s]')
+    group.add_argument('--jobs', type=int, default=os.cpu_count(),
+                       help='Number of worker processes. [%(default)s]')
+    group.add_argument('--seed', type=int, default=0,
+                       help='Random seed of every worker. [%(default)s]')
+
+def _init_worker(name, size, engine, attrs, directory, format, seed):
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    pg.init()
+    # pg.init traps SIGTERM, which the pool terminates its workers with
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    random.seed(seed)
+    scene = scenes.make_scene(name, size, engine)
+    for attr, value in attrs.items():
+        setattr(scene.model, attr, value)
+    _worker.update(
+        scene = scene,
+        surf = pg.Surface(size, 0, 32),
+        directory = directory,
+        format = format,
+    )
+
+def _render(frame):
+    index, frame_time = frame
+    surf = _worker['surf']
+    surf.fill((0,0,0))
+    _worker['scene'].draw(surf, frame_time)
+    if _worker['format'] == 'png':
+        path = _worker['directory'] / f'frame_{index:06d}.png'
+        pg.image.save(surf, str(path))
+        return path
+    return pg.image.tobytes(surf, 'RGB')
+
+def export(name, size, args, engine='python', attrs=None):
+    """
+    Render `args.frames` frames of a scene into `args.export` across a pool
+    of worker processes, each with its own copy of the scene.
+    """
+    directory = Path(args.export)
+    directory.mkdir(parents=True, exist_ok=True)
+    frames = [(index, args.start + index * args.dt) for index in range(args.frames)]
+    jobs = max(1, args.jobs)
+    chunksize = max(1, len(frames) // (jobs * 4))
+    initargs = (name, size, engine, attrs or {}, directory, args.format, args.seed)
+
+    start = time.perf_counter()
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(jobs, _init_worker, initargs) as pool:
+        # imap hands the results back in frame order
+        results = pool.imap(_render, frames, chunksize)
+        if args.format == 'rgb':
+            path = directory / 'frames.rgb'
+            with open(path, 'wb') as rgb_file:
+                for data in results:
+                    rgb_file.write(data)
+        else:
+            for _ in results:
+                pass
+        # let the workers exit, instead of terminating them on the way out
+        pool.close()
+        pool.join()
+    elapsed = time.perf_counter() - start
+    print(f'{len(frames)} frames of {size[0]}x{size[1]} {args.format} '
+          f'to {directory} in {elapsed:.2f}s ({len(frames) / elapsed:.2f} fps)')
@@ -0,0 +1,133 @@
+"""
+Cached heads up display text.
+"""
+import collections
+import contextlib
+import os
+import time
+
+with contextlib.redirect_stdout(open(os.devnull,'w')):
+    import pygame as pg
+
+# loaded fonts keyed by (fontname, size), shared by everything in the process
+_fonts = {}
+
+def font(size, fontname=None):
+    """
+    Font of `size` from `fontname`, or the default font, loaded once per
+    process.
+    """
+    key = (fontname, size)
+    loaded = _fonts.get(key)
+    if loaded is None:
+        loaded = _fonts[key] = pg.font.Font(fontname, size)
+    return loaded
+
+
+class TextCache:
+    """
+    Rendered text images keyed by (text, color, size), evicting the least
+    recently used beyond `maxsize`.
+    """
+
+    def __init__(self, maxsize=256, fontname=None, antialias=True):
+        self.maxsize = maxsize
+        self.fontname = fontname
+        self.antialias = antialias
+        self.images = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def font(self, size):
+        return font(size, self.fontname)
+
+    def render(self, text, color, size):
+        key = (text, tuple(color), size)
+        image = self.images.get(key)
+        if image is None:
+            self.misses += 1
+            image = self.font(size).render(text, self.antialias, color)
+            self.images[key] = image
+            if len(self.images) > self.maxsize:
+                self.images.popitem(last=False)
+        else:
+            self.hits += 1
+            self.images.move_to_end(key)
+        return image
+
+
+class Table:
+    """
+    Rows of right aligned text columns composed into one cached image.
+
+    Rows are keyed by their first cell. The image is composed again only
+    when the text of a row changes, and rows whose key is in `volatile`,
+    like fps, take new text at most every `refresh` seconds.
+    """
+
+    def __init__(self, cache, size, color, padding=5, refresh=0.25, volatile=()):
+        self.cache = cache
+        self.size = size
+        self.color = color
+        self.padding = padding
+        self.refresh = refresh
+        self.volatile = set(volatile)
+        self.rows = {}
+        self.image = None
+        self.dirty = True
+        self.refreshed = None
+
+    def update(self, rows, now=None):
+        """
+        Set the rows from a sequence of tuples of strings.
+        """
+        if now is None:
+            now = time.perf_counter()
+        refresh = self.refreshed is None or now - self.refreshed >= self.refresh
+        if refresh:
+            self.refreshed = now
+        keys = []
+        for row in rows:
+            key = row[0]
+            keys.append(key)
+            if key in self.volatile and not refresh and key in self.rows:
+                continue
+            if self.rows.get(key) != row:
+                self.rows[key] = row
+                self.dirty = True
+        if list(self.rows) != keys:
+            self.rows = {key: self.rows[key] for key in keys}
+            self.dirty = True
+
+    def compose(self):
+        images = [
+            [self.cache.render(text, self.color, self.size) for text in row]
+            for row in self.rows.values()]
+        ncolumns = max((len(row) for row in images), default=0)
+        widths = [0] * ncolumns
+        for row in images:
+            for column, image in enumerate(row):
+                widths[column] = max(widths[column], image.get_width())
+        heights = [max(image.get_height() for image in row) for row in images]
+        width = sum(widths) + self.padding * max(ncolumns - 1, 0)
+        self.image = pg.Surface((width, sum(heights)), pg.SRCALPHA)
+        y = 0
+        for row, height in zip(images, heights):
+            right = 0
+            for column, image in enumerate(row):
+                right += widths[column]
+                self.image.blit(image, image.get_rect(right=right, y=y))
+                right += self.padding
+            y += height
+        self.dirty = False
+
+    def draw(self, surf, **anchor):
+        """
+        Blit the table positioned by a rect keyword like topright and
+        return its rect.
+        """
+        if self.dirty:
+            self.compose()
+        rect = self.image.get_rect(**anchor)
+        surf.blit(self.image, rect)
+        return rect
@@ -0,0 +1,185 @@
+"""
+Run every demo in one process, with one pygame init and one window, and
+switch between them on a schedule or with page up and page down.
+"""
+import time
+
+# the cold start is measured from here, before pygame is imported
+START = time.perf_counter()
+
+import argparse
+import contextlib
+import importlib
+import os
+
+with contextlib.redirect_stdout(open(os.devnull,'w')):
+    import pygame as pg
+
+IMPORTED = time.perf_counter()
+
+import engine
+import scenes
+
+def breaking_broke(screen, clock, engine_name):
+    module = importlib.import_module('breaking_broke')
+    return module.BreakingBroke()
+
+def lorenzattractor(screen, clock, engine_name):
+    module = importlib.import_module('lorenzattractor')
+    return module.LorenzAttractor()
+
+def miniblackhole(screen, clock, engine_name):
+    module = importlib.import_module('miniblackhole')
+    blackhole = scenes.engine_class(module, engine_name, module.BlackHole)
+    return module.BlackHoleDemo(blackhole(2000, screen.get_size()), clock)
+
+def ringweave(screen, clock, engine_name):
+    module = importlib.import_module('ringweave')
+    weave = scenes.engine_class(module, engine_name, module.RingWeave)
+    return module.RingWeaveDemo(weave(screen.get_rect()), clock)
+
+def shatteredtunnel(screen, clock, engine_name):
+    module = importlib.import_module('shatteredtunnel')
+    tunnel = scenes.engine_class(module, engine_name, module.Tunnel)
+    return module.ShatteredTunnel(tunnel(), clock, screen.get_height() // 11)
+
+DEMOS = {
+    'breaking_broke': breaking_broke,
+    'lorenzattractor': lorenzattractor,
+    'miniblackhole': miniblackhole,
+    'ringweave': ringweave,
+    'shatteredtunnel': shatteredtunnel,
+}
+
+class Launcher:
+    """
+    State that runs one demo state at a time. A demo is imported and
+    created the first time it is shown and kept for when it is shown again.
+    """
+
+    def __init__(self, names, screen, clock, engine_name='python', interval=0):
+        self.names = names
+        self.screen = screen
+        self.clock = clock
+        self.engine_name = engine_name
+        self.interval = interval
+        self.states = {}
+        self.index = None
+        self.elapsed = 0
+        # milliseconds from a switch to the first frame drawn, per demo
+        self.first_switches = {}
+        self.warm_switches = {}
+        self.switched = None
+        self.switched_cold = False
+        self.cold_start = None
+        self.switch(0)
+
+    @property
+    def name(self):
+        return self.names[self.index]
+
+    @property
+    def state(self):
+        return self.states[self.name]
+
+    @property
+    def scale(self):
+        return getattr(self.state, 'scale', None)
+
+    @scale.setter
+    def scale(self, scale):
+        self.state.scale = scale
+
+    def switch(self, index):
+        self.switched = time.perf_counter()
+        self.index = index % len(self.names)
+        self.elapsed = 0
+        self.switched_cold = self.name not in self.states
+        if self.switched_cold:
+            self.states[self.name] = DEMOS[self.name](self.screen, self.clock,
+                                                      self.engine_name)
+        pg.display.set_caption(self.name)
+
+    def handle(self, event):
+        if event.type == pg.KEYDOWN and event.key == pg.K_PAGEDOWN:
+            self.switch(self.index + 1)
+        elif event.type == pg.KEYDOWN and event.key == pg.K_PAGEUP:
+            self.switch(self.index - 1)
+        else:
+            self.state.handle(event)
+
+    def update(self, ms, keys):
+        self.elapsed += ms
+        if self.interval and self.elapsed >= self.interval * 1000:
+            self.switch(self.index + 1)
+        self.state.update(ms, keys)
+
+    def draw(self, surf):
+        drawn = self.state.draw(surf)
+        if self.switched is not None:
+            now = time.perf_counter()
+            ms = (now - self.switched) * 1000
+            if self.cold_start is None:
+                self.cold_start = (now - START) * 1000
+            elif self.switched_cold:
+                self.first_switches.setdefault(self.name, ms)
+            else:
+                self.warm_switches.setdefault(self.name, []).append(ms)
+            self.switched = None
+            # whatever the last demo drew is stale
+            drawn = None
+        return drawn
+
+    def draw_hud(self, surf):
+        if hasattr(self.state, 'draw_hud'):
+            return self.state.draw_hud(surf)
+        return []
+
+    def report(self):
+        # None when it quit before the first frame
+        cold_start = 'no frame' if self.cold_start is None else f'{self.cold_start:.1f} ms'
+        lines = [f'cold start: {cold_start},'
+                 f' pygame import {(IMPORTED - START) * 1000:.1f} ms']
+        for name in self.names:
+            if name in self.first_switches:
+                lines.append(f'{name} first switch: {self.first_switches[name]:.1f} ms')
+            if name in self.warm_switches:
+                times = self.warm_switches[name]
+                lines.append(f'{name} warm switch: {sum(times) / len(times):.1f} ms'
+                             f' mean of {len(times)}')
+        return '\n'.join(lines)
+
+
+def main(argv=None):
+    """
+    Run the demos in one process and switch between them.
+    """
+    parser = argparse.ArgumentParser(prog='launcher', description=main.__doc__)
+    parser.add_argument('demos', nargs='*', metavar='DEMO',
+                        help=f'Demos in the order they are shown, from {", ".join(DEMOS)}.'
+                             ' [all]')
+    parser.add_argument('--xres', type=int, default=800,
+                        help='Horizontal resolution. [%(default)s]')
+    parser.add_argument('--yres', type=int, default=600,
+                        help='Vertical resolution. [%(default)s]')
+    parser.add_argument('--fps', type=int, default=60,
+                        help='Frames per second, 0 for no limit. [%(default)s]')
+    parser.add_argument('--engine', choices=['python', 'numpy'], default='python',
+                        help='Engine of the demos that have one. [%(default)s]')
+    parser.add_argument('--interval', type=float, default=0,
+                        help='Seconds before switching to the next demo, 0 to'
+                             ' switch only with page up and page down. [%(default)s]')
+    engine.add_arguments(parser)
+    args = parser.parse_args(argv)
+    for name in args.demos:
+        if name not in DEMOS:
+            parser.error(f'unknown demo {name!r}')
+    names = args.demos or list(DEMOS)
+    clock = engine.init(args)
+    screen = engine.set_mode(args, (args.xres, args.yres))
+    launcher = Launcher(names, screen, clock, args.engine, args.interval)
+    engine.Engine.from_args(args, clock, screen, launcher).run()
+    print(launcher.report())
+
+if __name__ == '__main__':
+    main()
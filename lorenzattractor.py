@@ -2,44 +2,20 @@ import argparse
 import contextlib
 import math
 import os
-import time
 
 from pathlib import Path
 
 with contextlib.redirect_stdout(open(os.devnull,'w')):
     import pygame as pg
 
-class Clock:
-
-    def __init__(self, framerate):
-        self.framerate = framerate
-        self._clock = pg.time.Clock()
-
-    def tick(self):
-        self._clock.tick(self.framerate)
-
-
-class Engine:
-
-    def __init__(self, clock, screen, state):
-        self.clock = clock
-        self.screen = screen
-        self.state = state
-
-    def run(self):
-        running = True
-        while running:
-            ms = self.clock.tick()
-            for event in pg.event.get():
-                if event.type == pg.QUIT:
-                    running = False
-                else:
-                    self.state.handle(event)
-            self.state.update(ms)
-            self.screen.fill((0,0,0))
-            self.state.draw(self.screen)
-            pg.display.flip()
+import engine
+import export
+import quality
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 class LorenzAttractor:
 
@@ -51,28 +27,197 @@ class LorenzAttractor:
         self.z_scale = 39
         self.c_scale = 20
         self.d_scale = 23
+        self.color = (200,200,200)
+        # surface pixels per pixel of the drawing, below 1 for a lower resolution
+        self.scale = 1
+        self.time = 0
+        self._trajectory_key = None
 
-    def draw(self, surf):
-        x = y = z = 1
-        a = b = c = d = 0
-        for i in range(self.n):
-            t = time.time()
-            x += (y - x) / self.x_scale
-            y += (self.y_offset - z) * x / self.y_scale
-            z += (x * y - z) / self.z_scale
-            c = int(400 + (x * math.cos(t) - y * math.sin(t)) * self.c_scale)
-            d = int(900 - z * self.d_scale)
-            if i > 0:
-                pg.draw.line(surf, (200,200,200), (a,b), (c,d), 1)
-            a, b = c, d
+    def trajectory(self):
+        """
+        Integrated x, y, z points, cached until the integration attributes
+        change.
+        """
+        key = (self.x_scale, self.y_offset, self.y_scale, self.z_scale, self.n)
+        if self._trajectory_key != key:
+            x = y = z = 1
+            points = []
+            for _ in range(self.n):
+                x += (y - x) / self.x_scale
+                y += (self.y_offset - z) * x / self.y_scale
+                z += (x * y - z) / self.z_scale
+                points.append((x, y, z))
+            if np is not None:
+                points = np.array(points, dtype=np.float64).reshape(-1, 3)
+            self._trajectory = points
+            self._trajectory_key = key
+        return self._trajectory
+
+    def draw(self, surf, t=None):
+        """
+        Draw the trajectory rotated by `t`, defaulting to the elapsed time.
+        """
+        if t is None:
+            t = self.time
+        trajectory = self.trajectory()
+        if len(trajectory) < 2:
+            return []
+        cos_t = math.cos(t)
+        sin_t = math.sin(t)
+        scale = self.scale
+        if np is None:
+            points = [
+                (int((400 + (x * cos_t - y * sin_t) * self.c_scale) * scale),
+                 int((900 - z * self.d_scale) * scale))
+                for x, y, z in trajectory]
+        else:
+            x, y, z = trajectory.T
+            points = np.empty((len(trajectory), 2), dtype=np.int64)
+            points[:,0] = (400 + (x * cos_t - y * sin_t) * self.c_scale) * scale
+            points[:,1] = (900 - z * self.d_scale) * scale
+        return [pg.draw.lines(surf, self.color, False, points, 1)]
 
     def handle(self, event):
         if event.type == pg.KEYDOWN:
             if event.key in (pg.K_ESCAPE, pg.K_q):
                 pg.event.post(pg.event.Event(pg.QUIT))
 
-    def update(self, ms):
-        pass
+    def update(self, ms, keys):
+        self.time += ms / 1000
+
+
+class LorenzSwarm(LorenzAttractor):
+    """
+    Particles started at small random offsets from the single trajectory's
+    start, advanced together one array step per update, each with a trail
+    of its last positions in a ring buffer.
+    """
+
+    integrators = ('euler', 'rk4')
+
+    def __init__(self, count=20000, spread=1e-3, integrator='euler', step=1, trail=16,
+                 seed=0):
+        if np is None:
+            raise RuntimeError('LorenzSwarm requires numpy')
+        super().__init__()
+        self.count = count
+        self.spread = spread
+        self.integrator = integrator
+        self.step = step
+        self.trail = trail
+        self.seed = seed
+        self._swarm_key = None
+        self._colors_key = None
+
+    def _update_swarm(self):
+        key = (self.count, self.spread, self.trail, self.seed)
+        if self._swarm_key == key:
+            return
+        rng = np.random.default_rng(self.seed)
+        start = 1 + rng.uniform(-self.spread, self.spread, (3, self.count))
+        # trail of x, y, z rows per step, the oldest right after the head
+        self._trail = np.empty((max(self.trail, 1), 3, self.count))
+        self._trail[:] = start
+        self._head = 0
+        self._swarm_key = key
+
+    def derivative(self, x, y, z):
+        return ((y - x) / self.x_scale,
+                (self.y_offset - z) * x / self.y_scale,
+                (x * y - z) / self.z_scale)
+
+    def advance(self):
+        """
+        Integrate every particle one step into the next slot of the trail.
+        """
+        self._update_swarm()
+        h = self.step
+        head = (self._head + 1) % len(self._trail)
+        x, y, z = self._trail[self._head]
+        if head == self._head:
+            # a trail of one is written over the positions it reads
+            x, y, z = self._trail[self._head].copy()
+        nx, ny, nz = self._trail[head]
+        if self.integrator == 'rk4':
+            k1 = self.derivative(x, y, z)
+            k2 = self.derivative(*(p + h / 2 * k for p, k in zip((x, y, z), k1)))
+            k3 = self.derivative(*(p + h / 2 * k for p, k in zip((x, y, z), k2)))
+            k4 = self.derivative(*(p + h * k for p, k in zip((x, y, z), k3)))
+            for out, p, a, b, c, d in zip((nx, ny, nz), (x, y, z), k1, k2, k3, k4):
+                out[:] = p + h / 6 * (a + 2 * b + 2 * c + d)
+        else:
+            # the single trajectory's update, where y uses the new x and z
+            # the new x and y
+            np.subtract(y, x, out=nx)
+            nx *= h / self.x_scale
+            nx += x
+            np.subtract(self.y_offset, z, out=ny)
+            ny *= nx
+            ny *= h / self.y_scale
+            ny += y
+            np.multiply(nx, ny, out=nz)
+            nz -= z
+            nz *= h / self.z_scale
+            nz += z
+        self._head = head
+
+    def _mapped_colors(self, surf):
+        # self.color faded by age, oldest first
+        key = (surf.get_bitsize(), surf.get_masks(), len(self._trail), self.color)
+        if self._colors_key != key:
+            ages = len(self._trail)
+            self._colors = np.array([
+                surf.map_rgb([int(channel * (age + 1) / ages) for channel in self.color])
+                for age in range(ages)])
+            self._colors_key = key
+        return self._colors
+
+    def draw(self, surf, t=None):
+        """
+        Draw the trails of every particle rotated by `t`, defaulting to the
+        elapsed time, newer positions over older.
+        """
+        if t is None:
+            t = self.time
+        self._update_swarm()
+        colors = self._mapped_colors(surf)
+        ages = len(self._trail)
+        cos_t = math.cos(t)
+        sin_t = math.sin(t)
+        scale = self.scale
+        clip = surf.get_clip()
+        pixels = pg.surfarray.pixels2d(surf)
+        bounds = []
+        # one contiguous slot of the ring at a time, oldest first
+        for age in range(ages):
+            x, y, z = self._trail[(self._head + 1 + age) % ages]
+            px = ((400 + (x * cos_t - y * sin_t) * self.c_scale) * scale).astype(np.int64)
+            py = ((900 - z * self.d_scale) * scale).astype(np.int64)
+            # negative offsets wrap around to huge unsigned ones
+            inside = (((px - clip.left).view(np.uint64) < clip.width)
+                      & ((py - clip.top).view(np.uint64) < clip.height))
+            px = px[inside]
+            py = py[inside]
+            if len(px):
+                pixels[px, py] = colors[age]
+                bounds.append((px.min(), py.min(), px.max(), py.max()))
+        del pixels
+        if not bounds:
+            return []
+        left, top, right, bottom = np.array(bounds).T
+        left, top = left.min(), top.min()
+        return [pg.Rect(left, top, right.max() - left + 1, bottom.max() - top + 1)]
+
+    def handle(self, event):
+        if event.type == pg.KEYDOWN and event.key == pg.K_r:
+            # back to the start
+            self._swarm_key = None
+        else:
+            super().handle(event)
+
+    def update(self, ms, keys):
+        super().update(ms, keys)
+        self.advance()
 
 
 def main(argv=None):
@@ -87,15 +232,39 @@ def main(argv=None):
     parser.add_argument('--yres', type=int, default=600,
                         help='Vertical resolution. [%(default)s]')
     parser.add_argument('--fps', type=int, default=60,
-                        help='Frames per second. [%(default)s]')
+                        help='Frames per second, 0 for no limit. [%(default)s]')
+    parser.add_argument('--swarm', type=int, default=0, metavar='COUNT',
+                        help='Integrate COUNT particles with trails instead of one'
+                             ' trajectory, R restarts them. [%(default)s]')
+    parser.add_argument('--integrator', choices=LorenzSwarm.integrators, default='euler',
+                        help='Integrator of the swarm. [%(default)s]')
+    parser.add_argument('--step', type=float, default=1,
+                        help='Step size of the swarm integrator. [%(default)s]')
+    parser.add_argument('--trail', type=int, default=16,
+                        help='Positions in the trail of each particle. [%(default)s]')
+    parser.add_argument('--spread', type=float, default=1e-3,
+                        help='Largest offset of a particle from the start. [%(default)s]')
+    engine.add_arguments(parser)
+    quality.add_arguments(parser)
+    export.add_arguments(parser)
     args = parser.parse_args(argv)
     size = (args.xres, args.yres)
-    pg.init()
-    clock = Clock(args.fps)
-    screen = pg.display.set_mode(size)
-    lorenzattractor = LorenzAttractor()
-    engine = Engine(clock, screen, LorenzAttractor())
-    engine.run()
+    if args.export and args.swarm:
+        parser.error('the swarm advances per update and cannot be exported by time')
+    if args.export:
+        export.export('lorenzattractor', size, args)
+        return
+    clock = engine.init(args)
+    screen = engine.set_mode(args, size)
+    if args.swarm:
+        lorenzattractor = LorenzSwarm(args.swarm, args.spread, args.integrator, args.step,
+                                      args.trail)
+        # changing the count or trail restarts the swarm
+        knobs = []
+    else:
+        lorenzattractor = LorenzAttractor()
+        knobs = [quality.Knob(lorenzattractor, 'n', 50, 5000)]
+    engine.Engine.from_args(args, clock, screen, lorenzattractor, knobs=knobs).run()
 
 if __name__ == '__main__':
     main()
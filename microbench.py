@@ -0,0 +1,294 @@
+"""
+Microbenchmarks of the kernels of the demos, with a JSON history of runs
+and a comparison against a stored baseline that flags slower kernels.
+"""
+import argparse
+import contextlib
+import datetime
+import fnmatch
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+
+from pathlib import Path
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+with contextlib.redirect_stdout(open(os.devnull,'w')):
+    import pygame as pg
+
+import benchmark
+import breaking_broke
+import lorenzattractor
+import miniblackhole
+import phases
+import ringweave
+import scenes
+import shatteredtunnel
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+RINGWEAVE_NSTEPS = (300, 3000, 30000)
+BREAK_SIZES = ((100, 50), (400, 200), (800, 400))
+BLACKHOLE_NSTARS = (500, 2000, 20000)
+
+def ringweave_kernels(surf, engine):
+    weave_class = scenes.engine_class(ringweave, engine, ringweave.RingWeave)
+    for nsteps in RINGWEAVE_NSTEPS:
+        weave = weave_class(surf.get_rect())
+        weave.nsteps = nsteps
+        if hasattr(weave, 'get_points'):
+            yield (f'{weave_class.__name__}.get_points nsteps={nsteps}',
+                   lambda weave=weave: weave.get_points(1.5))
+        else:
+            yield (f'{weave_class.__name__}.get_point nsteps={nsteps}',
+                   lambda weave=weave: [weave.get_point(index, 1.5)
+                                        for index in range(weave.nsteps)])
+        yield (f'{weave_class.__name__}.draw nsteps={nsteps}',
+               lambda weave=weave: weave.draw(surf, 1.5))
+
+def breaking_broke_kernels(surf, engine):
+    for size in BREAK_SIZES:
+        source = pg.Surface(size, pg.SRCALPHA)
+        source.fill((200, 10, 10))
+        name = f'{size[0]}x{size[1]}'
+        yield (f'breakmasks size={name}',
+               lambda size=size: [bounds for _, bounds in breaking_broke.breakmasks(size)])
+        yield (f'breakimage size={name}',
+               lambda source=source: breaking_broke.breakimage(source))
+
+def blackhole_kernels(surf, engine):
+    blackhole_class = scenes.engine_class(miniblackhole, engine, miniblackhole.BlackHole)
+    for nstars in BLACKHOLE_NSTARS:
+        blackhole = blackhole_class(nstars, surf.get_size())
+        yield (f'{blackhole_class.__name__}.draw nstars={nstars}',
+               lambda blackhole=blackhole: blackhole.draw(1.5, surf))
+
+def lorenzattractor_kernels(surf, engine):
+    attractor = lorenzattractor.LorenzAttractor()
+    yield 'LorenzAttractor.draw', lambda: attractor.draw(surf, 1.5)
+
+def shatteredtunnel_kernels(surf, engine):
+    tunnel_class = scenes.engine_class(shatteredtunnel, engine, shatteredtunnel.Tunnel)
+    tunnel = tunnel_class()
+    constants = shatteredtunnel.default_constants()
+    yield f'{tunnel_class.__name__}.draw', lambda: tunnel.draw(surf, 1.5, constants)
+
+KERNELS = (
+    ringweave_kernels,
+    breaking_broke_kernels,
+    blackhole_kernels,
+    lorenzattractor_kernels,
+    shatteredtunnel_kernels,
+)
+
+def kernels(surf, engine, patterns=()):
+    """
+    (name, function) of every kernel, or of those whose name matches one of
+    the shell style `patterns`.
+    """
+    for factory in KERNELS:
+        for name, function in factory(surf, engine):
+            if not patterns or any(fnmatch.fnmatchcase(name, p) for p in patterns):
+                yield name, function
+
+def measure(function, warmup, repeat, min_ms):
+    """
+    Time `function` after `warmup` untimed calls. Every one of `repeat`
+    samples runs it as many times as it takes to fill `min_ms`, found from
+    the warmup, and the summary is in milliseconds per call.
+    """
+    start = time.perf_counter_ns()
+    for _ in range(max(warmup, 1)):
+        function()
+    per_call = (time.perf_counter_ns() - start) / max(warmup, 1) / 1e6
+    number = max(1, int(min_ms / per_call)) if per_call else 1
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        for _ in range(number):
+            function()
+        samples.append((time.perf_counter_ns() - start) / number / 1e6)
+    samples.sort()
+    summary = {
+        'number': number,
+        'repeat': repeat,
+        'mean_ms': statistics.fmean(samples),
+        'stdev_ms': statistics.stdev(samples) if len(samples) > 1 else 0,
+        'min_ms': samples[0],
+    }
+    for p in benchmark.PERCENTILES:
+        summary[f'p{p}_ms'] = phases.percentile(samples, p)
+    return summary
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'pygame': pg.version.ver,
+        'numpy': np.__version__ if np is not None else None,
+        'machine': platform.machine(),
+        'system': platform.system(),
+    }
+
+def read_history(path):
+    path = Path(path)
+    if not path.exists():
+        return []
+    with open(path) as history_file:
+        return json.load(history_file)
+
+def write_history(path, history):
+    with open(path, 'w') as history_file:
+        json.dump(history, history_file, indent=2)
+
+def find_run(history, label):
+    """
+    The latest run in `history` with `label`, or None.
+    """
+    for run in reversed(history):
+        if run['label'] == label:
+            return run
+    return None
+
+def compare(baseline, current, threshold):
+    """
+    Rows of (kernel, baseline ms, current ms, change) for the kernels of
+    both runs, by median, and the names of those slower by more than
+    `threshold`.
+    """
+    rows = []
+    slower = []
+    for name, result in current['results'].items():
+        if name not in baseline['results']:
+            continue
+        before = baseline['results'][name]['p50_ms']
+        after = result['p50_ms']
+        change = after / before - 1 if before else 0
+        rows.append((name, before, after, change))
+        if change > threshold:
+            slower.append(name)
+    return rows, slower
+
+def format_results(results):
+    rows = [('kernel', 'number', 'mean_ms', 'stdev_ms', 'min_ms')
+            + tuple(f'p{p}_ms' for p in benchmark.PERCENTILES)]
+    for name, summary in results.items():
+        rows.append((name, str(summary['number']))
+                    + tuple(f'{summary[column]:.4f}' for column in rows[0][2:]))
+    return format_rows(rows)
+
+def format_comparison(rows, slower):
+    lines = [('kernel', 'baseline_ms', 'current_ms', 'change', '')]
+    for name, before, after, change in rows:
+        lines.append((name, f'{before:.4f}', f'{after:.4f}', f'{change:+.1%}',
+                      'SLOWER' if name in slower else ''))
+    return format_rows(lines)
+
+def format_rows(rows):
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    lines = ['  '.join([row[0].ljust(widths[0])]
+                       + [cell.rjust(width) for cell, width in zip(row[1:], widths[1:])])
+             for row in rows]
+    lines.insert(1, '  '.join('-' * width for width in widths))
+    return '\n'.join(line.rstrip() for line in lines)
+
+def main(argv=None):
+    """
+    Microbenchmarks of the demo kernels, with a history of runs to compare.
+    """
+    parser = argparse.ArgumentParser(prog=Path(__file__).stem, description=main.__doc__)
+    parser.add_argument('patterns', nargs='*', metavar='PATTERN',
+                        help='Run only the kernels that match a shell style pattern,'
+                             ' like "BlackHole.*". [all]')
+    parser.add_argument('--list', action='store_true',
+                        help='List the kernels and exit.')
+    parser.add_argument('--xres', type=int, default=800,
+                        help='Horizontal resolution of the surface. [%(default)s]')
+    parser.add_argument('--yres', type=int, default=600,
+                        help='Vertical resolution of the surface. [%(default)s]')
+    parser.add_argument('--engine', choices=['python', 'numpy'], default='python',
+                        help='Engine of the kernels that have one. [%(default)s]')
+    parser.add_argument('--warmup', type=int, default=5,
+                        help='Untimed calls of each kernel first. [%(default)s]')
+    parser.add_argument('--repeat', type=int, default=20,
+                        help='Timed samples of each kernel. [%(default)s]')
+    parser.add_argument('--min-ms', type=float, default=10,
+                        help='Shortest time of a sample, short kernels run several'
+                             ' times per sample. [%(default)s]')
+    parser.add_argument('--history', metavar='FILE', default='microbench.json',
+                        help='JSON file of runs the results are added to. [%(default)s]')
+    parser.add_argument('--label', default=None,
+                        help='Label of this run in the history. [the time]')
+    parser.add_argument('--compare', metavar='LABEL',
+                        help='Compare against the latest run labeled LABEL in the'
+                             ' history, exiting with 1 when a kernel is slower.')
+    parser.add_argument('--to', metavar='LABEL',
+                        help='With --compare, compare the stored run LABEL instead of'
+                             ' running the kernels.')
+    parser.add_argument('--threshold', type=float, default=.1,
+                        help='Slowdown of the median that is flagged, as a fraction.'
+                             ' [%(default)s]')
+    args = parser.parse_args(argv)
+
+    history = read_history(args.history)
+    baseline = None
+    if args.compare:
+        baseline = find_run(history, args.compare)
+        if baseline is None:
+            parser.error(f'no run labeled {args.compare!r} in {args.history}')
+    if args.to:
+        if not args.compare:
+            parser.error('--to needs --compare')
+        current = find_run(history, args.to)
+        if current is None:
+            parser.error(f'no run labeled {args.to!r} in {args.history}')
+    else:
+        pg.init()
+        surf = pg.display.set_mode((args.xres, args.yres))
+        selected = list(kernels(surf, args.engine, args.patterns))
+        if args.list:
+            print('\n'.join(name for name, _ in selected))
+            return
+        if not selected:
+            parser.error('no kernel matches')
+        results = {}
+        for name, function in selected:
+            # kernels that draw random pieces draw the same ones every run
+            random.seed(0)
+            surf.fill((0,0,0))
+            results[name] = measure(function, args.warmup, args.repeat, args.min_ms)
+        pg.quit()
+        now = datetime.datetime.now().isoformat(timespec='seconds')
+        current = {
+            'label': args.label or now,
+            'time': now,
+            'engine': args.engine,
+            'size': [args.xres, args.yres],
+            'environment': environment(),
+            'results': results,
+        }
+        print(format_results(results))
+        history.append(current)
+        write_history(args.history, history)
+
+    if baseline:
+        rows, slower = compare(baseline, current, args.threshold)
+        print()
+        if not rows:
+            print(f'no kernels in common with {baseline["label"]}')
+            return
+        print(f'{current["label"]} against {baseline["label"]}:')
+        print(format_comparison(rows, slower))
+        if slower:
+            print(f'{len(slower)} kernels slower by more than {args.threshold:.0%}')
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
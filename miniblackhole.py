@@ -6,6 +6,18 @@ import os
 with contextlib.redirect_stdout(open(os.devnull,'w')):
     import pygame as pg
 
+import engine
+import export
+import hud
+import phases
+import quality
+import tiles
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 def clamp(x, min, max):
     if x > max:
         x = max
@@ -23,90 +35,212 @@ class BlackHole:
         self.voffset = .1 # .2
         self.deepness = 2e4
         self.star_scale = int(self.size[1] * .005) # 9
+        # surface pixels per pixel of size, below 1 to draw at a lower resolution
+        self.scale = 1
 
     def draw(self, time, surf):
         space = surf.get_rect()
         centerx, centery = self.center
+        scale = self.scale
+        drawn = []
         for i in range(1, self.nstars):
             color = (clamp(99 * i, 0, 255), clamp(2 * i, 0, 255), clamp(i, 0, 255))
             angle = self.speed_up * time / i + math.sin(i ** 3)
             x = centerx + i * math.sin(angle)
             y = centery + self.voffset * (2 * i * math.cos(angle) + self.deepness / i)
-            s = math.sin(i) * self.star_scale
-            rect = pg.Rect(x, y, s, s)
+            s = math.sin(i) * self.star_scale * scale
+            rect = pg.Rect(x * scale, y * scale, s, s)
             if space.colliderect(rect):
-                pg.draw.rect(surf, color, rect)
-
-
-def loop(size, fps, nstars):
-    clock = pg.time.Clock()
-    screen = pg.display.set_mode(size)
-    space = screen.get_rect()
-    font = pg.font.Font(None, int(min(size) / 18))
-    font_color = (200, 200, 200)
-
-    blackhole = BlackHole(nstars, space.size)
-
-    keymap = { pg.K_h: ('voffset', .005),
-               pg.K_d: ('deepness', 100),
-               pg.K_j: ('star_scale', .1),
-               pg.K_s: ('speed_up', 1),
-               pg.K_n: ('nstars', 1) }
-
-    info = True
-    time = 0
-    padding = 5
-    while not pg.event.peek(pg.QUIT):
-        for event in pg.event.get():
-            if event.type == pg.KEYDOWN:
-                if event.key in (pg.K_ESCAPE, ):
-                    pg.event.post(pg.event.Event(pg.QUIT))
-                elif event.key == pg.K_TAB:
-                    info = not info
-
-        pressed = pg.key.get_pressed()
-        mods = pg.key.get_mods()
-        direction = -1 if mods & pg.KMOD_SHIFT else 1
-        for key, (attr, amount) in keymap.items():
-            if pressed[key]:
-                value = getattr(blackhole, attr) + direction * amount
-                setattr(blackhole, attr, value)
-
-        screen.fill((0,0,0))
-        blackhole.draw(time, screen)
-
-        if info:
-            table = ( ('time', f'{time:.2f}'),
-                      ('fps', f'{clock.get_fps():.2f}'),
-                      ('nstars', f'{blackhole.nstars}'),
-                      ('voffset', f'{blackhole.voffset:.2f}'),
-                      ('deepness', f'{blackhole.deepness}'),
-                      ('star_scale', f'{blackhole.star_scale:.2f}'),
-                      ('speed_up', f'{blackhole.speed_up:.2f}') )
-            label_width = 0
-            value_width = 0
-            height = 0
-            images = []
-            for label, value in table:
-                label_image = font.render(label, True, font_color)
-                value_image = font.render(value, True, font_color)
-                images.append((label_image, value_image))
-                if label_image.get_width() > label_width:
-                    label_width = label_image.get_width()
-                if value_image.get_width() > value_width:
-                    value_width = value_image.get_width()
-                height += max((label_image.get_height(), value_image.get_height()))
-            rect = pg.Rect(0, 0, label_width + value_width + padding, height)
-            rect.topright = space.inflate(-padding, -padding).topright
-            y = rect.top
-            for label_image, value_image in images:
-                screen.blit(label_image, (label_image.get_rect(right=rect.centerx, y=y)))
-                screen.blit(value_image, (value_image.get_rect(right=rect.right, y=y)))
-                y += max((label_image.get_height(), value_image.get_height()))
-
-        pg.display.flip()
-        ms = clock.tick(fps)
-        time += ms / 1000
+                drawn.append(pg.draw.rect(surf, color, rect))
+        return drawn
+
+
+class ArrayBlackHole(BlackHole):
+    """
+    BlackHole drawn with numpy straight into the surface's pixels.
+    """
+
+    def __init__(self, nstars, size):
+        if np is None:
+            raise RuntimeError('ArrayBlackHole requires numpy')
+        super().__init__(nstars, size)
+        # the tables are built on the first draw
+        self._capacity = 0
+        self._i = None
+        self._sizes_key = None
+        self._deep_key = None
+        self._colors_key = None
+
+    def _update_tables(self):
+        # Per star constants for i in range(1, capacity). They are grown
+        # geometrically so that holding the nstars key only slices them.
+        if self._i is None or self.nstars > self._capacity:
+            self._capacity = max(self.nstars, self._capacity * 2, 1)
+            i = np.arange(1, self._capacity, dtype=np.float64)
+            self._i = i
+            self._inverse = 1 / i
+            # same as math.sin(i ** 3) while i * i is exact
+            self._twist = np.sin(i * i * i)
+            self._sin = np.sin(i)
+            self._color_index = np.minimum(np.arange(1, self._capacity), 255)
+            self._sizes_key = self._deep_key = None
+
+        sizes_key = (self._capacity, self.star_scale, self.scale)
+        if self._sizes_key != sizes_key:
+            # pg.Rect truncates, stars smaller than a pixel are never drawn
+            sizes = (self._sin * (self.star_scale * self.scale)).astype(np.int64)
+            self._drawable = np.flatnonzero(sizes > 0)
+            self._sizes = sizes[self._drawable]
+            self._sizes_key = sizes_key
+            self._deep_key = None
+
+        if self._deep_key != (self._sizes_key, self.deepness):
+            drawable = self._drawable
+            self._star_i = self._i[drawable]
+            self._star_inverse = self._inverse[drawable]
+            self._star_twist = self._twist[drawable]
+            self._star_colors = self._color_index[drawable]
+            self._star_deep = self.deepness * self._star_inverse
+            self._deep_key = (self._sizes_key, self.deepness)
+
+    def _mapped_colors(self, surf):
+        key = (surf.get_bitsize(), surf.get_masks())
+        if self._colors_key != key:
+            self._colors = np.array(
+                [surf.map_rgb((clamp(99 * i, 0, 255), clamp(2 * i, 0, 255), clamp(i, 0, 255)))
+                 for i in range(256)])
+            self._colors_key = key
+        return self._colors
+
+    def draw(self, time, surf):
+        self._update_tables()
+        # number of drawable stars among range(1, nstars)
+        count = np.searchsorted(self._drawable, self.nstars - 1)
+        if count == 0:
+            return []
+        i = self._star_i[:count]
+        sizes = self._sizes[:count]
+        angle = (self.speed_up * time) * self._star_inverse[:count]
+        angle += self._star_twist[:count]
+        centerx, centery = self.center
+        scale = self.scale
+        x = ((centerx + i * np.sin(angle)) * scale).astype(np.int64)
+        y = ((centery + self.voffset * (2 * i * np.cos(angle) + self._star_deep[:count]))
+             * scale).astype(np.int64)
+
+        clip = surf.get_clip()
+        visible = np.flatnonzero(
+            (x < clip.right) & (x + sizes > clip.left)
+            & (y < clip.bottom) & (y + sizes > clip.top))
+        if not len(visible):
+            return []
+        x = x[visible]
+        y = y[visible]
+        sizes = sizes[visible]
+        colors = self._mapped_colors(surf)[self._star_colors[:count][visible]]
+
+        # Expand every star into its pixels, keeping star order so later
+        # stars overdraw earlier ones like the pg.draw.rect loop does.
+        areas = sizes * sizes
+        star = np.repeat(np.arange(len(sizes)), areas)
+        offset = np.arange(len(star)) - np.repeat(np.cumsum(areas) - areas, areas)
+        side = sizes[star]
+        px = x[star] + offset % side
+        py = y[star] + offset // side
+        inside = (px >= clip.left) & (px < clip.right) & (py >= clip.top) & (py < clip.bottom)
+        pixels = pg.surfarray.pixels2d(surf)
+        px = px[inside]
+        py = py[inside]
+        pixels[px, py] = colors[star[inside]]
+        del pixels
+        if not len(px):
+            return []
+        left = px.min()
+        top = py.min()
+        return [pg.Rect(left, top, px.max() - left + 1, py.max() - top + 1)]
+
+
+ENGINES = {
+    'python': BlackHole,
+    'numpy': ArrayBlackHole,
+}
+
+class BlackHoleDemo:
+    """
+    BlackHole with held keys to adjust it and a table of its attributes.
+    """
+
+    def __init__(self, blackhole, clock, renderer=None, hud_refresh=.25):
+        self.blackhole = blackhole
+        self.clock = clock
+        self.renderer = renderer
+        self.padding = 5
+        font_color = (200, 200, 200)
+        self.info_table = hud.Table(hud.TextCache(), int(min(blackhole.size) / 18),
+                                    font_color, self.padding, hud_refresh,
+                                    volatile=('time', 'fps', 'tile max ms'))
+        self.keymap = { pg.K_h: ('voffset', .005),
+                        pg.K_d: ('deepness', 100),
+                        pg.K_j: ('star_scale', .1),
+                        pg.K_s: ('speed_up', 1),
+                        pg.K_n: ('nstars', 1) }
+        self.info = True
+        self.time = 0
+
+    def handle(self, event):
+        if event.type == pg.KEYDOWN:
+            if event.key in (pg.K_ESCAPE, ):
+                pg.event.post(pg.event.Event(pg.QUIT))
+            elif event.key == pg.K_TAB:
+                self.info = not self.info
+
+    def update(self, ms, keys):
+        with phases.phase('keys'):
+            direction = -1 if keys.mods & pg.KMOD_SHIFT else 1
+            for key, (attr, amount) in self.keymap.items():
+                if keys.pressed[key]:
+                    value = getattr(self.blackhole, attr) + direction * amount
+                    setattr(self.blackhole, attr, value)
+        self.time += ms / 1000
+
+    @property
+    def scale(self):
+        # the bands of the renderer are always drawn at full resolution
+        return None if self.renderer else self.blackhole.scale
+
+    @scale.setter
+    def scale(self, scale):
+        self.blackhole.scale = scale
+
+    def draw(self, surf):
+        blackhole = self.blackhole
+        renderer = self.renderer
+        if renderer:
+            return [renderer.draw(surf, blackhole, self.time)]
+        return blackhole.draw(self.time, surf)
+
+    def draw_hud(self, surf):
+        if not self.info:
+            return []
+        return [self.draw_info(surf)]
+
+    def draw_info(self, surf):
+        blackhole = self.blackhole
+        renderer = self.renderer
+        table = ( ('time', f'{self.time:.2f}'),
+                  ('fps', f'{self.clock.get_fps():.2f}'),
+                  ('nstars', f'{blackhole.nstars}'),
+                  ('voffset', f'{blackhole.voffset:.2f}'),
+                  ('deepness', f'{blackhole.deepness}'),
+                  ('star_scale', f'{blackhole.star_scale:.2f}'),
+                  ('speed_up', f'{blackhole.speed_up:.2f}') )
+        if renderer:
+            table += ( ('tiles', f'{len(renderer.bands)}'),
+                       ('tile max ms', f'{max(renderer.timings):.2f}') )
+        self.info_table.update(table)
+        space = surf.get_rect().inflate(-self.padding, -self.padding)
+        return self.info_table.draw(surf, topright=space.topright)
+
 
 def main(argv=None):
     """
@@ -120,13 +254,39 @@ def main(argv=None):
     parser.add_argument('--yres', type=int, default=600,
                         help='Vertical resolution. [%(default)s]')
     parser.add_argument('--fps', type=int, default=60,
-                        help='Target frames per second. [%(default)s]')
+                        help='Target frames per second, 0 for no limit. [%(default)s]')
     parser.add_argument('--nstars', type=int, default=2000,
                         help='Number of stars. [%(default)s]')
+    parser.add_argument('--engine', choices=list(ENGINES), default='python',
+                        help='Star field engine. [%(default)s]')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='Rasterize in bands across worker processes. [%(default)s]')
+    parser.add_argument('--hud-refresh', type=float, default=.25,
+                        help='Seconds between updates of time and fps. [%(default)s]')
+    engine.add_arguments(parser)
+    quality.add_arguments(parser)
+    export.add_arguments(parser)
     args = parser.parse_args(argv)
-    pg.init()
     size = (args.xres, args.yres)
-    loop(size, args.fps, args.nstars)
+    if args.export:
+        export.export('miniblackhole', size, args, args.engine, {'nstars': args.nstars})
+        return
+    clock = engine.init(args)
+    screen = engine.set_mode(args, size)
+    blackhole = ENGINES[args.engine](args.nstars, size)
+    renderer = None
+    if args.workers:
+        renderer = tiles.TileRenderer('miniblackhole', size, args.workers, args.engine)
+    try:
+        demo = BlackHoleDemo(blackhole, clock, renderer, args.hud_refresh)
+        knobs = [quality.Knob(blackhole, 'nstars', max(args.nstars // 10, 2),
+                              args.nstars * 10)]
+        engine.Engine.from_args(args, clock, screen, demo, knobs=knobs).run()
+    finally:
+        # the workers are joined and the shared memory unlinked on errors too
+        if renderer:
+            renderer.close()
+            print(renderer.report())
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,218 @@
+"""
+Frame pacing strategies, and statistics of their jitter and of the latency
+from reading input to presenting the frame that shows it.
+
+tick
+    pg.time.Clock.tick, which sleeps with the coarse granularity of the OS.
+hybrid
+    Sleep until a little before the start of the frame, then spin on
+    perf_counter for the rest.
+deadline
+    Like hybrid, but aimed at presenting on the frame boundary instead of
+    starting on it. The frame starts as late as the recent work times allow,
+    so input is read as late as possible before it is presented.
+vsync
+    No waiting in the loop, the flip waits for the display with
+    set_mode(vsync=1) where the driver supports it. When frames still come
+    faster than --fps, it falls back to hybrid.
+"""
+import collections
+import contextlib
+import os
+import statistics
+import sys
+import time
+
+with contextlib.redirect_stdout(open(os.devnull,'w')):
+    import pygame as pg
+
+import phases
+
+MODES = ('tick', 'hybrid', 'deadline', 'vsync')
+
+def add_arguments(parser):
+    group = parser.add_argument_group('pacing')
+    group.add_argument('--pacing', choices=MODES, default='tick',
+                       help='How frames are paced to --fps. [%(default)s]')
+    group.add_argument('--spin-ms', type=float, default=2,
+                       help='Milliseconds spun instead of slept before a hybrid or'
+                            ' deadline frame. [%(default)s]')
+    group.add_argument('--deadline-margin', type=float, default=1,
+                       help='Milliseconds added to the predicted work of a deadline'
+                            ' frame. [%(default)s]')
+    group.add_argument('--pacing-stats', action='store_true',
+                       help='Print the jitter and latency of the frames on exit.')
+
+def from_args(args):
+    """
+    Clock of the hybrid, deadline or vsync pacing.
+    """
+    if args.pacing == 'hybrid':
+        return HybridClock(args.fps, args.spin_ms)
+    if args.pacing == 'deadline':
+        return DeadlineClock(args.fps, args.spin_ms, args.deadline_margin)
+    if args.pacing == 'vsync':
+        return VsyncClock(args.fps)
+    raise ValueError(f'no pacing clock for {args.pacing!r}')
+
+def set_mode(size, vsync=False):
+    """
+    Open the window, with vsync when asked and the driver can do it.
+    """
+    if vsync:
+        try:
+            return pg.display.set_mode(size, vsync=1)
+        except pg.error as error:
+            print(f'vsync not available, pacing to --fps without it: {error}', file=sys.stderr)
+    return pg.display.set_mode(size)
+
+
+class HybridClock:
+    """
+    Clock that starts frames every 1 / `framerate` seconds, sleeping until
+    `spin_ms` before the start and spinning from there, and returns the
+    precise milliseconds since the last tick. A frame that starts late
+    moves the schedule instead of rushing the frames after it.
+    """
+
+    def __init__(self, framerate, spin_ms=2):
+        self.framerate = framerate
+        self.spin = spin_ms / 1000
+        self.deadline = None
+        self.recent = collections.deque(maxlen=10)
+        self._last = None
+
+    @property
+    def period(self):
+        return 1 / self.framerate
+
+    def start(self):
+        """
+        perf_counter time the next frame should start at.
+        """
+        return self.deadline
+
+    def wait(self, now):
+        if not self.framerate:
+            return now
+        if self.deadline is None:
+            self.deadline = now
+        start = self.start()
+        if start - now > self.spin:
+            time.sleep(start - now - self.spin)
+        while now < start:
+            now = time.perf_counter()
+        self.deadline += self.period
+        if self.deadline < now:
+            # behind by a whole frame, start over from here
+            self.deadline = now + self.period
+        return now
+
+    def tick(self):
+        now = self.wait(time.perf_counter())
+        ms = 0 if self._last is None else (now - self._last) * 1000
+        self._last = now
+        if ms:
+            self.recent.append(ms)
+        return ms
+
+    def get_fps(self):
+        total = sum(self.recent)
+        return len(self.recent) * 1000 / total if total else 0
+
+
+class DeadlineClock(HybridClock):
+    """
+    Clock that aims to finish frames every 1 / `framerate` seconds, starting
+    each one the predicted work time, plus `margin_ms`, before its deadline.
+    The prediction is the 90th percentile of the recent work times, measured
+    from the end of one tick to the start of the next.
+    """
+
+    def __init__(self, framerate, spin_ms=2, margin_ms=1):
+        super().__init__(framerate, spin_ms)
+        self.margin = margin_ms / 1000
+        self.work = collections.deque(maxlen=30)
+        self._returned = None
+
+    def predicted(self):
+        if not self.work:
+            return 0
+        work = sorted(self.work)
+        return work[int(len(work) * .9)]
+
+    def start(self):
+        return self.deadline - min(self.predicted() + self.margin, self.period)
+
+    def wait(self, now):
+        if self._returned is not None:
+            self.work.append(now - self._returned)
+        now = super().wait(now)
+        self._returned = now
+        return now
+
+
+class VsyncClock(HybridClock):
+    """
+    Clock that does not wait, for when presenting waits for the display.
+    When the recent frames come well faster than `framerate`, the driver
+    did not give vsync, and it paces like the hybrid clock from then on.
+    """
+
+    def __init__(self, framerate):
+        super().__init__(framerate)
+        self.capped = False
+
+    def wait(self, now):
+        if (not self.capped and self.framerate
+                and len(self.recent) == self.recent.maxlen
+                and statistics.median(self.recent) < self.period * 1000 * .75):
+            self.capped = True
+            print('presenting does not wait for vsync, pacing to --fps instead',
+                  file=sys.stderr)
+        if self.capped:
+            return super().wait(now)
+        return now
+
+
+class PacingStats:
+    """
+    Times of every frame: when its input was read and when it was presented.
+    """
+
+    def __init__(self, mode, framerate):
+        self.mode = mode
+        self.framerate = framerate
+        self.polled = []
+        self.presented = []
+
+    def frame(self, polled, presented):
+        self.polled.append(polled)
+        self.presented.append(presented)
+
+    def report(self):
+        if len(self.presented) < 3:
+            return f'{self.mode} pacing: too few frames'
+        presented = self.presented
+        intervals = sorted((b - a) * 1000 for a, b in zip(presented, presented[1:]))
+        latency = sorted((b - a) * 1000 for a, b in zip(self.polled, self.presented))
+        poll_intervals = [(b - a) * 1000 for a, b in zip(self.polled, self.polled[1:])]
+        lines = [f'{self.mode} pacing over {len(self.presented)} frames:']
+        lines.append(f'  present interval: mean {statistics.fmean(intervals):.2f} ms,'
+                     f' stdev {statistics.stdev(intervals):.2f} ms,'
+                     f' p1 {phases.percentile(intervals, 1):.2f} ms,'
+                     f' p99 {phases.percentile(intervals, 99):.2f} ms')
+        if self.framerate:
+            period = 1000 / self.framerate
+            jitter = sorted(abs(interval - period) for interval in intervals)
+            late = sum(1 for interval in intervals if interval > period * 1.5)
+            lines.append(f'  jitter against {period:.2f} ms:'
+                         f' mean {statistics.fmean(jitter):.2f} ms,'
+                         f' p99 {phases.percentile(jitter, 99):.2f} ms,'
+                         f' {late} late frames')
+        # input arrives on average half way between two reads
+        waiting = statistics.fmean(poll_intervals) / 2
+        lines.append(f'  read to present: mean {statistics.fmean(latency):.2f} ms,'
+                     f' p95 {phases.percentile(latency, 95):.2f} ms,'
+                     f' input to present about {statistics.fmean(latency) + waiting:.2f} ms')
+        return '\n'.join(lines)
@@ -0,0 +1,217 @@
+"""
+Per-phase frame timing, with a stacked frame time graph, a CSV or JSONL
+trace and cProfile of one phase.
+
+Demos time parts of their own update and draw, like key handling and HUD
+text, with ``phases.phase(name)``, which does nothing unless an engine is
+profiling. Time in a nested phase counts only toward the nested phase.
+"""
+import collections
+import contextlib
+import cProfile
+import csv
+import json
+import os
+import pstats
+import time
+
+with contextlib.redirect_stdout(open(os.devnull,'w')):
+    import pygame as pg
+
+import hud
+
+PHASES = ('events', 'keys', 'update', 'draw', 'hud', 'present')
+
+COLORS = {
+    'events': (120, 120, 255),
+    'keys': (80, 200, 255),
+    'update': (80, 220, 120),
+    'draw': (240, 200, 60),
+    'hud': (240, 120, 200),
+    'present': (240, 80, 60),
+}
+
+# the profiler of the running engine
+active = None
+
+_null = contextlib.nullcontext()
+
+def phase(name):
+    """
+    Context that times a phase of the frame on the active profiler.
+    """
+    if active is None:
+        return _null
+    return active.phase(name)
+
+def percentile(sorted_values, p):
+    """
+    Nearest-rank percentile of already sorted values.
+    """
+    index = max(0, min(len(sorted_values) - 1, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def add_arguments(parser):
+    group = parser.add_argument_group('phases')
+    group.add_argument('--graph', action='store_true',
+                       help='Start with the frame time graph shown, F3 toggles it.')
+    group.add_argument('--trace', metavar='FILE',
+                       help='Write the nanoseconds of every phase of every frame to a'
+                            ' .csv or .jsonl file.')
+    group.add_argument('--cprofile', metavar='PHASE', choices=PHASES,
+                       help='Run cProfile inside PHASE.')
+    group.add_argument('--cprofile-frames', type=int, default=300,
+                       help='Frames to run cProfile for. [%(default)s]')
+    group.add_argument('--cprofile-out', metavar='FILE',
+                       help='Save the cProfile stats to FILE instead of printing them.')
+
+
+class Profiler:
+    """
+    Time the phases of every frame with perf_counter_ns, keeping the last
+    `history` frames.
+    """
+
+    def __init__(self, history=240, trace=None, cprofile=None, cprofile_frames=0,
+                 cprofile_out=None):
+        self.history = collections.deque(maxlen=history)
+        self.frames = 0
+        self.current = None
+        self._children = []
+        self._trace_file = None
+        self._trace_writer = None
+        if trace:
+            self._trace_file = open(trace, 'w', newline='')
+            if not trace.endswith('.jsonl'):
+                self._trace_writer = csv.writer(self._trace_file)
+                self._trace_writer.writerow(('frame',) + PHASES)
+        self.cprofile = cprofile
+        self.cprofile_frames = cprofile_frames
+        self.cprofile_out = cprofile_out
+        self._cprofiler = cProfile.Profile() if cprofile else None
+
+    @classmethod
+    def from_args(cls, args):
+        return cls(trace=args.trace, cprofile=args.cprofile,
+                   cprofile_frames=args.cprofile_frames, cprofile_out=args.cprofile_out)
+
+    def begin_frame(self):
+        self.current = dict.fromkeys(PHASES, 0)
+
+    def end_frame(self):
+        self.frames += 1
+        self.history.append(self.current)
+        if self._trace_writer:
+            self._trace_writer.writerow((self.frames,) + tuple(self.current.values()))
+        elif self._trace_file:
+            row = dict(frame=self.frames, **self.current)
+            self._trace_file.write(json.dumps(row) + '\n')
+        if self._cprofiler and self.frames == self.cprofile_frames:
+            self.report_cprofile()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        profiling = name == self.cprofile and self._cprofiler is not None
+        if profiling:
+            self._cprofiler.enable()
+        self._children.append(0)
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter_ns() - start
+            if profiling:
+                self._cprofiler.disable()
+            children = self._children.pop()
+            self.current[name] += elapsed - children
+            if self._children:
+                self._children[-1] += elapsed
+
+    def means(self):
+        """
+        Mean milliseconds per phase over the history.
+        """
+        count = max(len(self.history), 1)
+        return {name: sum(frame[name] for frame in self.history) / count / 1e6
+                for name in PHASES}
+
+    def report_cprofile(self):
+        profiler = self._cprofiler
+        self._cprofiler = None
+        if self.cprofile_out:
+            profiler.dump_stats(self.cprofile_out)
+        else:
+            print(f'cProfile of {self.cprofile} for {self.frames} frames')
+            pstats.Stats(profiler).sort_stats('cumulative').print_stats(25)
+
+    def close(self):
+        if self._cprofiler:
+            self.report_cprofile()
+        if self._trace_file:
+            self._trace_file.close()
+            self._trace_file = None
+
+
+class Graph:
+    """
+    Stacked bars of phase times, one pixel column per frame, scrolled in
+    place so that only the newest column is drawn. The full height is
+    `scale` milliseconds and a dot marks `budget` milliseconds.
+    """
+
+    def __init__(self, size=(240, 120), scale=1000/30, budget=None, fontsize=16,
+                 refresh=.25):
+        self.image = pg.Surface(size)
+        self.image.set_alpha(200)
+        self.scale = scale
+        self.budget = budget
+        self.cache = hud.TextCache()
+        self.fontsize = fontsize
+        self.refresh = refresh
+        self.legend = None
+        self.refreshed = None
+
+    def add_frame(self, frame):
+        image = self.image
+        width, height = image.get_size()
+        image.scroll(-1, 0)
+        x = width - 1
+        image.fill((0,0,0), (x, 0, 1, height))
+        bottom = height
+        for name in PHASES:
+            top = bottom - frame[name] / 1e6 / self.scale * height
+            if int(top) < int(bottom):
+                image.fill(COLORS[name], (x, int(top), 1, int(bottom) - int(top)))
+            bottom = top
+        if self.budget:
+            y = height - int(self.budget / self.scale * height)
+            if 0 <= y < height:
+                image.set_at((x, y), (255,255,255))
+
+    def compose_legend(self, means):
+        images = [self.cache.render(f'{name} {means[name]:.2f}ms', COLORS[name],
+                                    self.fontsize)
+                  for name in PHASES]
+        width = max(image.get_width() for image in images)
+        self.legend = pg.Surface((width, sum(image.get_height() for image in images)),
+                                 pg.SRCALPHA)
+        y = 0
+        for image in images:
+            self.legend.blit(image, (0, y))
+            y += image.get_height()
+
+    def draw(self, surf, profiler, **anchor):
+        """
+        Add the last frame of `profiler` and blit the graph, positioned by a
+        rect keyword, with a legend of mean times under it. Return the rect
+        of both.
+        """
+        if profiler.history:
+            self.add_frame(profiler.history[-1])
+        now = time.perf_counter()
+        if self.refreshed is None or now - self.refreshed >= self.refresh:
+            self.refreshed = now
+            self.compose_legend(profiler.means())
+        rect = surf.blit(self.image, self.image.get_rect(**anchor))
+        legend_rect = surf.blit(self.legend, self.legend.get_rect(topleft=rect.bottomleft))
+        return rect.union(legend_rect)
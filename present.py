@@ -0,0 +1,85 @@
+"""
+Dirty rectangle presentation.
+"""
+import contextlib
+import os
+
+with contextlib.redirect_stdout(open(os.devnull,'w')):
+    import pygame as pg
+
+class DirtyPresenter:
+    """
+    Erase and present only the rects drawn this frame and last frame,
+    falling back to a full fill and flip when damage exceeds `threshold` of
+    the screen's area or is unknown. A background of None never erases.
+    """
+
+    def __init__(self, screen, background=(0,0,0), threshold=.5, maxrects=64):
+        self.screen = screen
+        self.background = background
+        self.threshold = threshold
+        self.maxrects = maxrects
+        # None means the whole screen
+        self.previous = None
+        self.current = []
+        self.frames = 0
+        self.flips = 0
+
+    def clear(self):
+        """
+        Erase what was drawn last frame.
+        """
+        if self.background is None:
+            # the drawing covers the screen
+            pass
+        elif self.previous is None:
+            self.screen.fill(self.background)
+        else:
+            for rect in self.previous:
+                self.screen.fill(self.background, rect)
+        self.current = []
+
+    def add(self, rects):
+        """
+        Add rects drawn this frame. A single rect is allowed and None means
+        the whole screen changed.
+        """
+        if rects is None:
+            self.current = None
+        elif self.current is not None:
+            if isinstance(rects, pg.Rect):
+                self.current.append(rects)
+            else:
+                self.current.extend(rects)
+
+    def _merge(self, rects):
+        space = self.screen.get_rect()
+        rects = [space.clip(rect) for rect in rects]
+        rects = [rect for rect in rects if rect.width and rect.height]
+        if len(rects) > self.maxrects:
+            rects = [rects[0].unionall(rects[1:])]
+        return rects
+
+    def present(self):
+        self.frames += 1
+        current = None if self.current is None else self._merge(self.current)
+        if current is None or self.previous is None:
+            damage = None
+        else:
+            # last frame's rects mostly overlap this frame's
+            damage = []
+            for rect in self.previous + current:
+                index = rect.collidelist(damage)
+                if index < 0:
+                    damage.append(rect)
+                else:
+                    damage[index] = damage[index].union(rect)
+            area = sum(rect.width * rect.height for rect in damage)
+            if area > self.threshold * self.screen.get_width() * self.screen.get_height():
+                damage = None
+        if damage is None:
+            self.flips += 1
+            pg.display.flip()
+        else:
+            pg.display.update(damage)
+        self.previous = current
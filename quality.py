@@ -0,0 +1,134 @@
+"""
+Adaptive quality that holds a target frame rate by adjusting the workload
+knobs of a demo from its recent frame times.
+"""
+import collections
+
+def add_arguments(parser):
+    group = parser.add_argument_group('quality')
+    group.add_argument('--quality', action='store_true',
+                       help='Adjust the workload to hold --fps, or 60 when it is 0.')
+    group.add_argument('--quality-window', type=int, default=30,
+                       help='Frames averaged before adjusting. [%(default)s]')
+    group.add_argument('--quality-min', type=float, default=0,
+                       help='Lowest quality level, from 0 to 1. [%(default)s]')
+    group.add_argument('--quality-max', type=float, default=1,
+                       help='Highest quality level, from 0 to 1. [%(default)s]')
+
+def from_args(args, knobs):
+    """
+    Controller for `knobs` from the parsed quality arguments, or None when
+    it is not enabled.
+    """
+    if not args.quality:
+        return None
+    budget = 1000 / (args.fps or 60)
+    return QualityController(knobs, budget, window=args.quality_window,
+                             minimum=args.quality_min, maximum=args.quality_max)
+
+
+class Knob:
+    """
+    Workload attribute that goes from `low` at quality level 0 to `high` at
+    level 1. The target is a dict, whose item `name` is set, or an object,
+    whose dotted attribute `name` is set.
+    """
+
+    def __init__(self, target, name, low, high, cast=int):
+        self.target = target
+        self.name = name
+        self.low = low
+        self.high = high
+        self.cast = cast
+
+    def _owner(self):
+        if isinstance(self.target, dict):
+            return self.target, self.name
+        owner = self.target
+        *path, attr = self.name.split('.')
+        for name in path:
+            owner = getattr(owner, name)
+        return owner, attr
+
+    def get(self):
+        owner, attr = self._owner()
+        if isinstance(owner, dict):
+            return owner[attr]
+        return getattr(owner, attr)
+
+    def set(self, value):
+        owner, attr = self._owner()
+        if isinstance(owner, dict):
+            owner[attr] = value
+        else:
+            setattr(owner, attr, value)
+
+    def level(self):
+        """
+        Quality level of the current value.
+        """
+        if self.high == self.low:
+            return 1
+        return min(max((self.get() - self.low) / (self.high - self.low), 0), 1)
+
+    def apply(self, level):
+        self.set(self.cast(self.low + (self.high - self.low) * level))
+
+
+class QualityController:
+    """
+    Lower the quality level when the mean work time of the last `window`
+    frames goes over `high` of the budget, and raise it when it goes under
+    `low`. The band between them, and waiting a full window after every
+    change, keep the level from oscillating. It starts from the lowest
+    level of its knobs, which is applied to all of them.
+    """
+
+    def __init__(self, knobs, budget, window=30, high=.9, low=.6, down=.1, up=.05,
+                 minimum=0, maximum=1, level=None):
+        self.knobs = knobs
+        self.budget = budget
+        self.high = high
+        self.low = low
+        self.down = down
+        self.up = up
+        self.minimum = minimum
+        self.maximum = maximum
+        self.times = collections.deque(maxlen=window)
+        if level is None:
+            level = min((knob.level() for knob in knobs), default=maximum)
+        self.level = min(max(level, minimum), maximum)
+        # every knob at the one level, or the first change makes them jump
+        for knob in knobs:
+            if knob.level() != self.level:
+                knob.apply(self.level)
+        # mean work time of the last full window
+        self.measured = 0
+        self.changes = 0
+
+    def record(self, ms):
+        """
+        Record the milliseconds of work in a frame, not counting time spent
+        waiting on the clock, and adjust the level when due.
+        """
+        self.times.append(ms)
+        if len(self.times) < self.times.maxlen:
+            return
+        mean = self.measured = sum(self.times) / len(self.times)
+        if mean > self.high * self.budget:
+            level = self.level - self.down
+        elif mean < self.low * self.budget:
+            level = self.level + self.up
+        else:
+            return
+        level = min(max(level, self.minimum), self.maximum)
+        if level != self.level:
+            self.level = level
+            self.changes += 1
+            for knob in self.knobs:
+                knob.apply(level)
+            # the old times say nothing about the new level
+            self.times.clear()
+
+    def label(self):
+        return f'{self.level:.0%} ({self.measured:.1f}/{self.budget:.1f}ms)'
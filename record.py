@@ -0,0 +1,150 @@
+"""
+Recording and replay of the input of a demo, for runs that can be repeated
+exactly.
+
+A recording starts with a header of the magic bytes, the format version,
+the random seed and the number of keys. Then every frame is its elapsed
+milliseconds, the modifiers, the count of pressed keys and the count of
+events, followed by the scancodes of the pressed keys and the type, key
+and modifiers of each key and quit event.
+"""
+import collections
+import contextlib
+import os
+import random
+import struct
+import time
+
+with contextlib.redirect_stdout(open(os.devnull,'w')):
+    import pygame as pg
+
+import phases
+
+MAGIC = b'PGRE'
+VERSION = 1
+
+HEADER = struct.Struct('<4sHIH')
+FRAME = struct.Struct('<dHHH')
+EVENT = struct.Struct('<IiH')
+
+# events that are recorded, the only ones the demos look at
+EVENT_TYPES = (pg.KEYDOWN, pg.KEYUP, pg.QUIT)
+
+def add_arguments(parser):
+    group = parser.add_argument_group('record')
+    group.add_argument('--record', metavar='FILE',
+                       help='Record the input of every frame to FILE.')
+    group.add_argument('--replay', metavar='FILE',
+                       help='Replay the input recorded in FILE as fast as possible,'
+                            ' without a window.')
+
+
+class Recorder:
+    """
+    Clock that wraps a real clock and writes the milliseconds, keyboard and
+    events of every frame to `path`.
+    """
+
+    def __init__(self, clock, path, seed=None):
+        if seed is None:
+            seed = random.randrange(2 ** 32)
+        random.seed(seed)
+        self.clock = clock
+        self.framerate = clock.framerate
+        self.file = open(path, 'wb')
+        self.file.write(HEADER.pack(MAGIC, VERSION, seed, len(pg.key.get_pressed())))
+        self.ms = 0
+        self.frames = 0
+
+    def tick(self):
+        self.ms = self.clock.tick()
+        return self.ms
+
+    def get_fps(self):
+        return self.clock.get_fps()
+
+    def poll(self):
+        events = pg.event.get()
+        pressed = pg.key.get_pressed()
+        mods = pg.key.get_mods()
+        scancodes = [scancode for scancode, down in enumerate(pressed) if down]
+        recorded = [event for event in events if event.type in EVENT_TYPES]
+        self.file.write(FRAME.pack(self.ms, mods, len(scancodes), len(recorded)))
+        self.file.write(struct.pack(f'<{len(scancodes)}H', *scancodes))
+        for event in recorded:
+            self.file.write(EVENT.pack(event.type, getattr(event, 'key', 0),
+                                       getattr(event, 'mod', 0)))
+        self.frames += 1
+        return events, (pressed, mods)
+
+    def close(self):
+        self.file.close()
+        print(f'recorded {self.frames} frames')
+
+
+class Replay:
+    """
+    Clock that plays back a recording, returning the recorded milliseconds
+    without waiting, and the recorded keyboard and events. It keeps the
+    real time spent on every frame.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as replay_file:
+            self.data = replay_file.read()
+        magic, version, seed, self.nkeys = HEADER.unpack_from(self.data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path} is not a version {VERSION} recording')
+        random.seed(seed)
+        self.offset = HEADER.size
+        self.frame = None
+        self.recent = collections.deque(maxlen=10)
+        self.times = []
+        self.last = None
+
+    def tick(self):
+        """
+        Milliseconds of the next frame, or None after the last.
+        """
+        now = time.perf_counter()
+        if self.last is not None:
+            self.times.append((now - self.last) * 1000)
+        self.last = now
+        if self.offset >= len(self.data):
+            return None
+        ms, mods, npressed, nevents = FRAME.unpack_from(self.data, self.offset)
+        self.offset += FRAME.size
+        scancodes = struct.unpack_from(f'<{npressed}H', self.data, self.offset)
+        self.offset += 2 * npressed
+        events = []
+        for _ in range(nevents):
+            type, key, mod = EVENT.unpack_from(self.data, self.offset)
+            self.offset += EVENT.size
+            if type == pg.QUIT:
+                events.append(pg.event.Event(type))
+            else:
+                events.append(pg.event.Event(type, key=key, mod=mod))
+        pressed = [False] * self.nkeys
+        for scancode in scancodes:
+            pressed[scancode] = True
+        self.frame = (events, (pg.key.ScancodeWrapper(pressed), mods))
+        self.recent.append(ms)
+        return ms
+
+    def get_fps(self):
+        total = sum(self.recent)
+        return len(self.recent) * 1000 / total if total else 0
+
+    def poll(self):
+        return self.frame
+
+    def report(self):
+        times = sorted(self.times)
+        if not times:
+            return 'replayed 0 frames'
+        p95 = phases.percentile(times, 95)
+        return (f'replayed {len(times)} frames: mean {sum(times) / len(times):.2f} ms,'
+                f' median {times[len(times) // 2]:.2f} ms, p95 {p95:.2f} ms')
+
+    def close(self):
+        print(self.report())
@@ -9,6 +9,19 @@ from pathlib import Path
 with contextlib.redirect_stdout(open(os.devnull,'w')):
     import pygame as pg
 
+import bake
+import engine
+import export
+import hud
+import phases
+import quality
+import sweep
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 class Key:
 
     def __init__(self, code, cooldown):
@@ -38,15 +51,13 @@ class Keymap:
         self.keyattrs = keyattrs
         self.target = target
 
-    def update(self):
+    def update(self, keys):
         for keyattr in self.keyattrs:
             keyattr.key.update()
-        pressed = pg.key.get_pressed()
-        mods = pg.key.get_mods()
-        shift = mods & pg.KMOD_SHIFT
+        shift = keys.mods & pg.KMOD_SHIFT
         sign = -1 if shift else 1
         for keyattr in self.keyattrs:
-            if keyattr.key.is_pressed(pressed):
+            if keyattr.key.is_pressed(keys.pressed):
                 value = getattr(self.target, keyattr.attr)
                 setattr(self.target, keyattr.attr, value + sign * keyattr.amount)
                 keyattr.key.heat = keyattr.key.cooldown
@@ -65,6 +76,61 @@ class RingWeave:
         self.nwaves = 4
         self.somevar = 159
         self.spread = self.base / 8 # 60
+        # surface pixels per pixel of space, below 1 to draw at a lower resolution
+        self.scale = 1
+        # pixels the polyline may stray from the curve, 0 to use every step
+        self.tolerance = 0
+        # vertices of the last polyline drawn
+        self.vertices = 0
+        self._indices_key = None
+
+    def sample_indices(self):
+        """
+        Indices of the steps that are drawn as vertices, every step without
+        a tolerance. With one the vertices are spaced by the bound on the
+        curve's second derivative at each step, so that the chords stay
+        within tolerance of the curve: few where the ring is a plain circle
+        and every step where the waves are large.
+        """
+        key = (self.nsteps, self.somevar, self.focus, self.nwaves, self.base, self.spread,
+               self.tolerance, self.scale)
+        if self._indices_key != key:
+            if self.tolerance > 0 and self.nsteps > 2:
+                self._indices = self._adaptive_indices()
+            else:
+                self._indices = range(max(self.nsteps, 0))
+            self._indices_key = key
+        return self._indices
+
+    def _curvature_terms(self):
+        # The radius is base + spread * sin(omega * index + ...) * envelope
+        # and the angle turns by spin per index, so the second derivative of
+        # a point is bounded by ddr + 2 * dr * spin + radius * spin ** 2.
+        omega = abs(1 / (self.nsteps / math.tau) + self.nwaves / self.somevar)
+        spin = abs(1 / self.somevar)
+        # chord error is h ** 2 * bound / 8 for steps of h indices
+        limit = 8 * self.tolerance / self.scale
+        return omega, spin, abs(self.spread), abs(self.base), limit
+
+    def _adaptive_indices(self):
+        omega, spin, spread, base, limit = self._curvature_terms()
+        envelope = [(math.sin(index / self.somevar) / 2 + 0.5) ** self.focus
+                    for index in range(-1, self.nsteps + 1)]
+        indices = []
+        total = 0
+        for index in range(self.nsteps):
+            before, e, after = envelope[index:index + 3]
+            d1 = abs(after - before) / 2
+            d2 = abs(after - 2 * e + before)
+            dr = spread * (d1 + e * omega)
+            ddr = spread * (d2 + 2 * d1 * omega + e * omega * omega)
+            bound = ddr + 2 * dr * spin + (base + spread * e) * spin * spin
+            # vertices per step, a vertex where the running sum passes an integer
+            previous = total
+            total += min(math.sqrt(bound / limit), 1)
+            if int(total) > int(previous) or index == 0 or index == self.nsteps - 1:
+                indices.append(index)
+        return indices
 
     def get_point(self, index, time):
         angle = index / self.somevar + time
@@ -78,12 +144,21 @@ class RingWeave:
         return (x, y)
 
     def draw(self, surf, time):
-        points = [self.get_point(index, time) for index in range(self.nsteps)]
-        self.draw_points(surf, points)
+        points = [self.get_point(index, time) for index in self.sample_indices()]
+        self.vertices = len(points)
         #self.draw_circles(surf, points)
+        return [self.draw_points(surf, points)]
 
     def draw_points(self, surf, points):
-        pg.draw.lines(surf, self.color, self.closed % 2, points, self.width)
+        width = self.width
+        if self.scale != 1:
+            points = self.scale_points(points)
+            width = max(1, int(width * self.scale))
+        return pg.draw.lines(surf, self.color, self.closed % 2, points, width)
+
+    def scale_points(self, points):
+        scale = self.scale
+        return [(x * scale, y * scale) for x, y in points]
 
     def draw_circles(self, surf, points):
         for i, point in enumerate(points):
@@ -91,56 +166,179 @@ class RingWeave:
                 pg.draw.circle(surf, (200,10,10), tuple(map(int, point)), 20, 1)
 
 
-def loop(clock, screen, size, fps, ringweave):
-    space = screen.get_rect()
-    font = pg.font.Font(None, int(min(size) / 18))
-    font_color = (200, 200, 200)
-
-    cooldown = 15 # frames
-    keymap = Keymap(
-            [
-                KeyAttr(Key(pg.K_w, cooldown), 'width', 1),
-                KeyAttr(Key(pg.K_n, cooldown), 'nsteps', 1),
-                KeyAttr(Key(pg.K_b, cooldown), 'base', 1),
-                KeyAttr(Key(pg.K_s, cooldown), 'spread', 1),
-                KeyAttr(Key(pg.K_x, cooldown), 'somevar', 1),
-                # when 0 the whole circle is wavey
-                KeyAttr(Key(pg.K_f, cooldown), 'focus', 1),
-                KeyAttr(Key(pg.K_c, cooldown), 'closed', 1),
-                # seems to be the number of waves inside the focus
-                KeyAttr(Key(pg.K_a, cooldown), 'nwaves', 1),
-            ],
-            ringweave,
-        )
-
-    time = 0
-    while not pg.event.peek(pg.QUIT):
-        for event in pg.event.get():
-            if event.type == pg.KEYDOWN:
-                if event.key in (pg.K_ESCAPE, pg.K_q):
-                    pg.event.post(pg.event.Event(pg.QUIT))
-                elif event.key == pg.K_r:
-                    # reset
-                    keymap.target = RingWeave(screen.get_rect())
-        keymap.update()
-        # clear
-        screen.fill((0,0,0))
-        # draw info
-        rect = None
-        for keyattr in keymap.keyattrs:
-            value = getattr(keymap.target, keyattr.attr)
-            text = f'{keyattr.attr}, {pg.key.name(keyattr.key.code)} +/-{keyattr.amount}: {value}'
-            image = font.render(text, True, font_color)
-            rect = image.get_rect(topright = rect.bottomright if rect else space.topright)
-            screen.blit(image, rect)
-        # draw ring weave
-        keymap.target.draw(screen, time)
-
-        pg.display.flip()
-        seconds = clock.tick(fps) / 1000
-        time += seconds
-
-        pg.display.set_caption(f'{clock.get_fps():.2f}')
+class ArrayRingWeave(RingWeave):
+    """
+    RingWeave evaluated from per-index tables into a reused point buffer.
+    """
+
+    def __init__(self, space):
+        if np is None:
+            raise RuntimeError('ArrayRingWeave requires numpy')
+        super().__init__(space)
+        self._tables_key = None
+
+    def _update_tables(self):
+        # With angle = index / somevar + time the focus envelope is
+        # (sin(index / somevar) / 2 + .5) ** focus, which is independent of
+        # time, and the phase of the waves splits into a per-index part
+        # plus nwaves * time.
+        indices = self.sample_indices()
+        key = self._indices_key
+        if self._tables_key == key:
+            return
+        index = np.asarray(indices, dtype=np.float64)
+        angle = index / self.somevar
+        self._cos = np.cos(angle)
+        self._sin = np.sin(angle)
+        self._phase = index / (self.nsteps / math.tau) + angle * self.nwaves
+        self._envelope = (np.sin(angle) / 2 + 0.5) ** self.focus
+        self._points = np.empty((len(index), 2))
+        self._radius = np.empty(len(index))
+        self._temp = np.empty(len(index))
+        self._tables_key = key
+
+    def _adaptive_indices(self):
+        omega, spin, spread, base, limit = self._curvature_terms()
+        index = np.arange(-1, self.nsteps + 1)
+        envelope = (np.sin(index / self.somevar) / 2 + 0.5) ** self.focus
+        e = envelope[1:-1]
+        d1 = np.abs(envelope[2:] - envelope[:-2]) / 2
+        d2 = np.abs(envelope[2:] - 2 * e + envelope[:-2])
+        dr = spread * (d1 + e * omega)
+        ddr = spread * (d2 + 2 * d1 * omega + e * omega * omega)
+        bound = ddr + 2 * dr * spin + (base + spread * e) * spin * spin
+        total = np.floor(np.cumsum(np.minimum(np.sqrt(bound / limit), 1)))
+        vertex = np.diff(total, prepend=0) > 0
+        vertex[[0, -1]] = True
+        return np.flatnonzero(vertex)
+
+    def get_points(self, time):
+        """
+        Points of the curve at `time` as an array that is reused by the next
+        call.
+        """
+        self._update_tables()
+        radius = self._radius
+        temp = self._temp
+        x = self._points[:,0]
+        y = self._points[:,1]
+        np.add(self._phase, time * self.nwaves, out=radius)
+        np.sin(radius, out=radius)
+        radius *= self._envelope
+        radius *= self.spread
+        radius += self.base
+        # rotate the per-index angle by time
+        cos_time = math.cos(time)
+        sin_time = math.sin(time)
+        np.multiply(self._cos, cos_time, out=x)
+        np.multiply(self._sin, sin_time, out=temp)
+        x -= temp
+        x *= radius
+        x += self.space.centerx
+        np.multiply(self._sin, cos_time, out=y)
+        np.multiply(self._cos, sin_time, out=temp)
+        y += temp
+        y *= radius
+        y += self.space.centery
+        return self._points
+
+    def draw(self, surf, time):
+        points = self.get_points(time)
+        self.vertices = len(points)
+        if len(points) < 2:
+            return []
+        return [self.draw_points(surf, points)]
+
+    def scale_points(self, points):
+        return np.multiply(points, self.scale)
+
+
+ENGINES = {
+    'python': RingWeave,
+    'numpy': ArrayRingWeave,
+}
+
+
+class RingWeaveDemo:
+    """
+    RingWeave with keys to adjust it and a table of its attributes, played
+    from baked cycles in `cache` when it has them.
+    """
+
+    def __init__(self, ringweave, clock, cache=None):
+        self.clock = clock
+        self.cache = cache
+        font_color = (200, 200, 200)
+        self.info_table = hud.Table(hud.TextCache(), int(min(ringweave.space.size) / 18),
+                                    font_color)
+        cooldown = 15 # frames
+        self.keymap = Keymap(
+                [
+                    KeyAttr(Key(pg.K_w, cooldown), 'width', 1),
+                    KeyAttr(Key(pg.K_n, cooldown), 'nsteps', 1),
+                    KeyAttr(Key(pg.K_b, cooldown), 'base', 1),
+                    KeyAttr(Key(pg.K_s, cooldown), 'spread', 1),
+                    KeyAttr(Key(pg.K_x, cooldown), 'somevar', 1),
+                    # when 0 the whole circle is wavey
+                    KeyAttr(Key(pg.K_f, cooldown), 'focus', 1),
+                    KeyAttr(Key(pg.K_c, cooldown), 'closed', 1),
+                    # seems to be the number of waves inside the focus
+                    KeyAttr(Key(pg.K_a, cooldown), 'nwaves', 1),
+                    KeyAttr(Key(pg.K_t, cooldown), 'tolerance', .25),
+                ],
+                ringweave,
+            )
+        self.time = 0
+
+    @property
+    def ringweave(self):
+        return self.keymap.target
+
+    def handle(self, event):
+        if event.type == pg.KEYDOWN:
+            if event.key in (pg.K_ESCAPE, pg.K_q):
+                pg.event.post(pg.event.Event(pg.QUIT))
+            elif event.key == pg.K_r:
+                # reset, keeping the sampling
+                ringweave = type(self.ringweave)(self.ringweave.space)
+                ringweave.tolerance = self.ringweave.tolerance
+                self.keymap.target = ringweave
+
+    @property
+    def scale(self):
+        return self.ringweave.scale
+
+    @scale.setter
+    def scale(self, scale):
+        self.ringweave.scale = scale
+
+    def update(self, ms, keys):
+        with phases.phase('keys'):
+            self.keymap.update(keys)
+        self.time += ms / 1000
+
+    def draw(self, surf):
+        if self.cache:
+            points = self.cache.lookup(self.ringweave, self.time)
+            if points is not None:
+                self.ringweave.vertices = len(points)
+                return [self.ringweave.draw_points(surf, points)]
+        return self.ringweave.draw(surf, self.time)
+
+    def draw_hud(self, surf):
+        table = []
+        for keyattr in self.keymap.keyattrs:
+            value = getattr(self.ringweave, keyattr.attr)
+            key = pg.key.name(keyattr.key.code)
+            label = f'{keyattr.attr}, {key} +/-{keyattr.amount}:'
+            table.append((label, f'{value}'))
+        table.append(('vertices:', f'{self.ringweave.vertices}'))
+        if self.cache:
+            table.append(('cycle:', self.cache.status()))
+        self.info_table.update(table)
+        rect = self.info_table.draw(surf, topright=surf.get_rect().topright)
+        pg.display.set_caption(f'{self.clock.get_fps():.2f}')
+        return [rect]
 
 def prompt(msg, valid, caseinsensitive=True, default=None):
     valid = set(valid.lower() if caseinsensitive else valid)
@@ -171,16 +369,25 @@ def main(argv=None):
     parser.add_argument('--yres', type=int, default=600,
                         help='Vertical resolution. [%(default)s]')
     parser.add_argument('--fps', type=int, default=60,
-                        help='Target frames per second. [%(default)s]')
+                        help='Target frames per second, 0 for no limit. [%(default)s]')
+    parser.add_argument('--engine', choices=list(ENGINES), default='python',
+                        help='Curve engine. [%(default)s]')
+    parser.add_argument('--tolerance', type=float, default=0,
+                        help='Pixels the polyline may stray from the curve, which'
+                             ' drops the steps where it is a plain circle, 0 to'
+                             ' draw every step. [%(default)s]')
     parser.add_argument('--config', help='Load from config.')
     parser.add_argument('--yes', action='store_true', help='Always save config.')
+    engine.add_arguments(parser)
+    quality.add_arguments(parser)
+    export.add_arguments(parser)
+    sweep.add_arguments(parser)
+    bake.add_arguments(parser)
     args = parser.parse_args(argv)
     size = (args.xres, args.yres)
 
-    pg.init()
-    clock = pg.time.Clock()
-    screen = pg.display.set_mode(size)
-    ringweave = RingWeave(screen.get_rect())
+    ringweave = ENGINES[args.engine](pg.Rect((0, 0), size))
+    ringweave.tolerance = args.tolerance
 
     attrs = ['base', 'closed', 'focus', 'nsteps', 'nwaves', 'somevar', 'spread']
     if args.config:
@@ -191,10 +398,30 @@ def main(argv=None):
             value = cp.getint('ringweave', attr, fallback=fallback)
             setattr(ringweave, attr, value)
 
-    loop(clock, screen, size, args.fps, ringweave)
+    config = {attr: getattr(ringweave, attr) for attr in attrs}
+    # offline frames are drawn like the live ones, though it is not saved
+    config['tolerance'] = ringweave.tolerance
+    if args.export:
+        export.export('ringweave', size, args, args.engine, config)
+        return
+    if args.sweep:
+        sweep.sweep('ringweave', size, args, config, args.engine, jobs=args.jobs)
+        return
+
+    clock = engine.init(args)
+    screen = engine.set_mode(args, size)
+    cache = bake.from_args(args)
+    demo = RingWeaveDemo(ringweave, clock, cache)
+    # through the demo, which replaces its ringweave on reset
+    knobs = [quality.Knob(demo, 'ringweave.nsteps', ringweave.nsteps // 10,
+                          ringweave.nsteps * 2)]
+    engine.Engine.from_args(args, clock, screen, demo, knobs=knobs).run()
     pg.quit()
+    if cache:
+        cache.close()
 
-    if (args.config
+    ringweave = demo.ringweave
+    if (args.config and not args.replay
             and (args.yes or prompt('Save config? [y/N]> ', 'yn', default='n') == 'y')):
             for attr in attrs:
                 cp['ringweave'][attr] = str(getattr(ringweave, attr))
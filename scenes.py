@@ -0,0 +1,90 @@
+"""
+Uniform wrappers around the demos for driving them without their loops.
+
+Every scene is made from a screen size, and optionally the name of one of
+the demo's array engines, and draws one frame for a time in seconds with
+``scene.draw(surf, time)``. The demo object is available as ``scene.model``
+for tweaking its attributes.
+"""
+import collections
+import contextlib
+import importlib
+import math
+import os
+
+with contextlib.redirect_stdout(open(os.devnull,'w')):
+    import pygame as pg
+
+Scene = collections.namedtuple('Scene', 'model draw')
+
+# The live tunnel advances its angle once per frame at this rate.
+TUNNEL_FRAMERATE = 60
+
+def engine_class(module, engine, default):
+    """
+    Class of the named engine in a demo module, falling back to `default` for
+    demos without that engine.
+    """
+    engines = getattr(module, 'ENGINES', {})
+    return engines.get(engine, default)
+
+def breaking_broke(size, engine='python'):
+    module = importlib.import_module('breaking_broke')
+    model = module.BreakingBroke()
+
+    def draw(surf, time):
+        return model.draw(surf)
+
+    return Scene(model, draw)
+
+def lorenzattractor(size, engine='python'):
+    module = importlib.import_module('lorenzattractor')
+    model = module.LorenzAttractor()
+
+    def draw(surf, time):
+        return model.draw(surf, time)
+
+    return Scene(model, draw)
+
+def miniblackhole(size, engine='python'):
+    module = importlib.import_module('miniblackhole')
+    model = engine_class(module, engine, module.BlackHole)(2000, size)
+
+    def draw(surf, time):
+        return model.draw(time, surf)
+
+    return Scene(model, draw)
+
+def ringweave(size, engine='python'):
+    module = importlib.import_module('ringweave')
+    model = engine_class(module, engine, module.RingWeave)(pg.Rect((0, 0), size))
+
+    def draw(surf, time):
+        return model.draw(surf, time)
+
+    return Scene(model, draw)
+
+def shatteredtunnel(size, engine='python'):
+    module = importlib.import_module('shatteredtunnel')
+    tunnel = engine_class(module, engine, module.Tunnel)()
+    model = module.default_constants()
+
+    def draw(surf, time, angle=None, step=1):
+        # the live loop passes its own angle and step
+        if angle is None:
+            angle = (time * TUNNEL_FRAMERATE * model[pg.K_w]) % math.tau
+        tunnel.step = step
+        return tunnel.draw(surf, angle, model)
+
+    return Scene(model, draw)
+
+SCENES = {
+    'breaking_broke': breaking_broke,
+    'lorenzattractor': lorenzattractor,
+    'miniblackhole': miniblackhole,
+    'ringweave': ringweave,
+    'shatteredtunnel': shatteredtunnel,
+}
+
+def make_scene(name, size, engine='python'):
+    return SCENES[name](size, engine)
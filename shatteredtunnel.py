@@ -9,43 +9,42 @@ import os
 with contextlib.redirect_stdout(open(os.devnull,'w')):
     import pygame as pg
 
-def run(framerate, size, fontsize):
-    pg.init()
-    clock = pg.time.Clock()
-    screen = pg.display.set_mode(size)
-    space = screen.get_rect()
-    font = pg.font.Font(None, fontsize)
-    angle = 0
-    original_constants = {
+import engine
+import export
+import hud
+import phases
+import quality
+import tiles
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+def default_constants():
+    return {
         pg.K_z: 1e5, # used to calculate a radius
         pg.K_y: 3e4, # used to calculate size of rects.
         pg.K_x: 9,   # used to calculate lightness and the size of rects.
         pg.K_w: .01, # angle step.
     }
-    constants = original_constants.copy()
-    while not pg.event.peek(pg.QUIT):
-        clock.tick(framerate)
-        for event in pg.event.get():
-            if event.type == pg.KEYDOWN:
-                if event.key in (pg.K_ESCAPE, pg.K_q):
-                    pg.event.post(pg.event.Event(pg.QUIT))
-
-        pressed = pg.key.get_pressed()
-        modifiers = pg.key.get_mods()
-        ctrl = modifiers & pg.KMOD_CTRL
-        shift = modifiers & pg.KMOD_SHIFT
-        for key, value in constants.items():
-            if pressed[key]:
-                if ctrl:
-                    # reset
-                    constants[key] = original_constants[key]
-                else:
-                    # adjust
-                    value = original_constants[key] * .005
-                    if shift:
-                        value = -value
-                    constants[key] += value
 
+class Tunnel:
+    """
+    The tunnel drawn one rect at a time.
+    """
+
+    def __init__(self):
+        # surface pixels per pixel of the tunnel, below 1 for a lower resolution
+        self.scale = 1
+        # step between the i of rects, above 1 for fewer rects
+        self.step = 1
+
+    def draw(self, surf, angle, constants):
+        """
+        Draw one frame of the tunnel at `angle` into `surf`. It covers the
+        whole surface.
+        """
         # the code I expanded in his custom javascript editor.
         """
         for(c.width |= k=i=960; --i;) {
@@ -59,10 +58,12 @@ def run(framerate, size, fontsize):
           x.fillRect(xpos, ypos, width, width);
         }
         """
-        angle = (angle + constants[pg.K_w]) % math.tau
+        space = surf.get_rect()
+        scale = self.scale
         color = pg.Color(255,255,255)
-        screen.fill(color)
-        k = i = space.width / 2
+        surf.fill(color)
+        k = i = space.width / scale / 2
+        step = max(int(self.step), 1)
         while i > 0:
             color.hsla = (0, 99, (i / constants[pg.K_x]) % 100, 100)
             # He uses the time in seconds divided by four here, where I use
@@ -71,31 +72,203 @@ def run(framerate, size, fontsize):
             m = k * j
             r = constants[pg.K_z] / i
             x = k + math.sin(j) * i + math.sin(m) * r
-            y = (space.height / 2) + math.cos(j) * i + math.cos(m) * r
-            size = constants[pg.K_y] / i * math.sin(j * constants[pg.K_x])
-            rect = pg.Rect(x, y, size, size)
-            pg.draw.rect(screen, color, rect)
-            i -= 1
-
-        prev = pg.Rect(space.left, -space.height, space.width, space.height)
-        for key, value in constants.items():
-            image = font.render(f'{pg.key.name(key)}: {value:.4f}', True, (0,0,200))
-            prev = image.get_rect(topright=prev.bottomright)
-            screen.blit(image, prev)
-        image = font.render(f'FPS: {clock.get_fps():.2f}', True, (0,0,200))
-        screen.blit(image, image.get_rect(topright=prev.bottomright))
-
-        pg.display.flip()
+            y = (space.height / scale / 2) + math.cos(j) * i + math.cos(m) * r
+            size = constants[pg.K_y] / i * math.sin(j * constants[pg.K_x]) * scale
+            rect = pg.Rect(x * scale, y * scale, size, size)
+            pg.draw.rect(surf, color, rect)
+            i -= step
+
+
+class TableTunnel(Tunnel):
+    """
+    Tunnel drawn from per-i tables that are rebuilt only when the constants
+    or the surface size change.
+    """
+
+    # lightness steps per percent in the HSL to RGB table
+    lightness_steps = 100
+
+    def __init__(self):
+        if np is None:
+            raise RuntimeError('TableTunnel requires numpy')
+        super().__init__()
+        self._tables_key = None
+        self._lut_key = None
+
+    def _mapped_lut(self, surf):
+        # hsl(0, 99%, lightness) for every lightness step, mapped to surf
+        key = (surf.get_bitsize(), surf.get_masks())
+        if self._lut_key != key:
+            color = pg.Color(255,255,255)
+            lut = []
+            for step in range(100 * self.lightness_steps + 1):
+                color.hsla = (0, 99, step / self.lightness_steps, 100)
+                lut.append(surf.map_rgb(color))
+            self._lut = np.array(lut)
+            self._lut_key = key
+            self._tables_key = None
+        return self._lut
+
+    def _update_tables(self, surf, constants):
+        lut = self._mapped_lut(surf)
+        step = max(int(self.step), 1)
+        key = (surf.get_size(), self.scale, step, tuple(constants.items()))
+        if self._tables_key == key:
+            return
+        width, height = surf.get_size()
+        k = width / self.scale / 2
+        # the same i values, in the same order, as the loop
+        i = k - np.arange(math.ceil(k / step)) * step
+        self._k = k
+        self._centery = height / self.scale / 2
+        self._i = i
+        self._ratio = i / k
+        self._radius = constants[pg.K_z] / i
+        self._size = constants[pg.K_y] / i
+        self._size_frequency = constants[pg.K_x]
+        lightness = (i / constants[pg.K_x]) % 100
+        self._colors = lut[np.rint(lightness * self.lightness_steps).astype(np.int64)]
+        self._tables_key = key
+
+    def draw(self, surf, angle, constants):
+        """
+        Draw one frame of the tunnel at `angle` into `surf`.
+        """
+        self._update_tables(surf, constants)
+        surf.fill((255,255,255))
+        i = self._i
+        k = self._k
+        j = self._ratio + angle
+        m = k * j
+        sin_m = np.sin(m)
+        cos_m = np.cos(m)
+        scale = self.scale
+        x = ((k + np.sin(j) * i + sin_m * self._radius) * scale).astype(np.int64)
+        y = ((self._centery + np.cos(j) * i + cos_m * self._radius) * scale).astype(np.int64)
+        size = (self._size * np.sin(j * self._size_frequency) * scale).astype(np.int64)
+        # Clip here, surf.fill is off by one for rects hanging off the top.
+        clip = surf.get_clip()
+        left = np.maximum(x, clip.left)
+        top = np.maximum(y, clip.top)
+        right = np.minimum(x + size, clip.right)
+        bottom = np.minimum(y + size, clip.bottom)
+        visible = np.flatnonzero((size > 0) & (left < right) & (top < bottom))
+        rects = np.stack((left, top, right - left, bottom - top), axis=1)[visible]
+        fill = surf.fill
+        for color, rect in zip(self._colors[visible].tolist(), rects.tolist()):
+            fill(color, rect)
+
+ENGINES = {
+    'python': Tunnel,
+    'numpy': TableTunnel,
+}
+
+class ShatteredTunnel:
+    """
+    Tunnel with keys to adjust its constants, ctrl to reset them and shift
+    to go the other way.
+    """
+
+    # frames per second the angle speed was tuned for
+    framerate = 60
+
+    def __init__(self, tunnel, clock, fontsize, renderer=None, hud_refresh=.25):
+        self.tunnel = tunnel
+        self.clock = clock
+        self.renderer = renderer
+        self.info_table = hud.Table(hud.TextCache(), fontsize, (0,0,200),
+                                    refresh=hud_refresh, volatile=('FPS:', 'tiles:'))
+        self.original_constants = default_constants()
+        self.constants = self.original_constants.copy()
+        self.angle = 0
+
+    def handle(self, event):
+        if event.type == pg.KEYDOWN:
+            if event.key in (pg.K_ESCAPE, pg.K_q):
+                pg.event.post(pg.event.Event(pg.QUIT))
+
+    def update(self, ms, keys):
+        constants = self.constants
+        with phases.phase('keys'):
+            ctrl = keys.mods & pg.KMOD_CTRL
+            shift = keys.mods & pg.KMOD_SHIFT
+            for key, value in constants.items():
+                if keys.pressed[key]:
+                    if ctrl:
+                        # reset
+                        constants[key] = self.original_constants[key]
+                    else:
+                        # adjust
+                        value = self.original_constants[key] * .005
+                        if shift:
+                            value = -value
+                        constants[key] += value
+        frames = ms * self.framerate / 1000
+        self.angle = (self.angle + constants[pg.K_w] * frames) % math.tau
+
+    @property
+    def scale(self):
+        # the bands of the renderer are always drawn at full resolution
+        return None if self.renderer else self.tunnel.scale
+
+    @scale.setter
+    def scale(self, scale):
+        self.tunnel.scale = scale
+
+    def draw(self, surf):
+        if self.renderer:
+            self.renderer.draw(surf, self.constants, None, self.angle, self.tunnel.step)
+        else:
+            self.tunnel.draw(surf, self.angle, self.constants)
+        # the tunnel covers the whole surface
+        return None
+
+    def draw_hud(self, surf):
+        table = [(f'{pg.key.name(key)}:', f'{value:.4f}')
+                 for key, value in self.constants.items()]
+        table.append(('FPS:', f'{self.clock.get_fps():.2f}'))
+        if self.renderer:
+            table.append(('tiles:', f'{len(self.renderer.bands)}, '
+                                    f'max {max(self.renderer.timings):.2f}ms'))
+        self.info_table.update(table)
+        return [self.info_table.draw(surf, topright=surf.get_rect().topright)]
 
 def main(argv=None):
     "Shattered Tunnel"
     parser = argparse.ArgumentParser(description=main.__doc__)
-    parser.add_argument('--framerate', default=60)
+    parser.add_argument('--fps', '--framerate', dest='fps', default=60, type=int,
+                        help='Target frames per second, 0 for no limit. [%(default)s]')
     parser.add_argument('--width', default=960, type=int)
     parser.add_argument('--height', default=540, type=int)
     parser.add_argument('--fontsize', default=48, type=int)
+    parser.add_argument('--engine', choices=list(ENGINES), default='python')
+    parser.add_argument('--workers', default=0, type=int)
+    parser.add_argument('--hud-refresh', default=.25, type=float)
+    engine.add_arguments(parser)
+    quality.add_arguments(parser)
+    export.add_arguments(parser)
     args = parser.parse_args(argv)
-    run(args.framerate, (args.width,args.height), args.fontsize)
+    if args.export:
+        export.export('shatteredtunnel', (args.width, args.height), args, args.engine)
+        return
+    size = (args.width, args.height)
+    clock = engine.init(args)
+    screen = engine.set_mode(args, size)
+    renderer = None
+    if args.workers:
+        renderer = tiles.TileRenderer('shatteredtunnel', size, args.workers, args.engine)
+    try:
+        state = ShatteredTunnel(ENGINES[args.engine](), clock, args.fontsize, renderer,
+                                args.hud_refresh)
+        # nothing to erase, the tunnel covers the screen
+        knobs = [quality.Knob(state.tunnel, 'step', 8, 1)]
+        engine.Engine.from_args(args, clock, screen, state, background=None,
+                                knobs=knobs).run()
+    finally:
+        # the workers are joined and the shared memory unlinked on errors too
+        if renderer:
+            renderer.close()
+            print(renderer.report())
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,197 @@
+"""
+Parameter sweeps of a demo, rendered headless across a pool of processes
+into labeled contact sheets and an index file.
+"""
+import argparse
+import configparser
+import contextlib
+import csv
+import itertools
+import multiprocessing
+import os
+import signal
+import sys
+import time
+
+from pathlib import Path
+
+with contextlib.redirect_stdout(open(os.devnull,'w')):
+    import pygame as pg
+
+import hud
+import scenes
+
+# state of a worker process, set by _init_worker
+_worker = {}
+
+def add_arguments(parser):
+    group = parser.add_argument_group('sweep')
+    group.add_argument('--sweep', metavar='DIR',
+                       help='Render a sweep of parameters into contact sheets in DIR.')
+    group.add_argument('--vary', metavar='ATTR=RANGE', action='append', default=[],
+                       type=parse_vary,
+                       help='Values of an attribute, as START:STOP[:STEP] with STOP'
+                            ' included, or as a comma separated list.')
+    group.add_argument('--configs', metavar='DIR',
+                       help='Sweep every config file in DIR.')
+    group.add_argument('--thumb', metavar='WxH', type=parse_size, default=(160, 120),
+                       help='Size of a thumbnail. [160x120]')
+    group.add_argument('--strip', type=int, default=1,
+                       help='Frames in the strip of each combination. [%(default)s]')
+    group.add_argument('--strip-dt', type=float, default=.5,
+                       help='Seconds between the frames of a strip. [%(default)s]')
+    group.add_argument('--columns', type=int, default=10,
+                       help='Combinations per row of a sheet. [%(default)s]')
+    group.add_argument('--rows', type=int, default=10,
+                       help='Rows per sheet. [%(default)s]')
+
+def parse_number(string):
+    try:
+        return int(string)
+    except ValueError:
+        return float(string)
+
+def parse_vary(string):
+    """
+    Parse ATTR=START:STOP[:STEP] or ATTR=A,B,C into the attribute name and
+    its list of values.
+    """
+    attr, sep, values = string.partition('=')
+    if not sep or not attr:
+        raise argparse.ArgumentTypeError(f'expected ATTR=RANGE, got {string!r}')
+    if ':' in values:
+        start, stop, *step = map(parse_number, values.split(':'))
+        step = step[0] if step else 1
+        if step <= 0:
+            raise argparse.ArgumentTypeError('step must be positive')
+        count = int((stop - start) / step + 1e-9) + 1
+        return attr, [start + step * n for n in range(count)]
+    return attr, [parse_number(value) for value in values.split(',')]
+
+def parse_size(string):
+    width, _, height = string.partition('x')
+    return (int(width), int(height))
+
+def read_configs(directory, section, defaults):
+    """
+    Config from every file in `directory`, each starting from `defaults`.
+    """
+    configs = []
+    for path in sorted(Path(directory).iterdir()):
+        if not path.is_file():
+            continue
+        cp = configparser.ConfigParser()
+        cp.read(path)
+        config = {attr: cp.getint(section, attr, fallback=value)
+                  for attr, value in defaults.items()}
+        configs.append((path.name, config))
+    return configs
+
+def combinations(base, varies, configs=None):
+    """
+    Every (source, config) from the product of the configs, or `base` alone,
+    and the values of each varied attribute.
+    """
+    configs = configs or [('', base)]
+    names = [attr for attr, _ in varies]
+    for (source, config), values in itertools.product(
+            configs, itertools.product(*(values for _, values in varies))):
+        config = dict(config)
+        config.update(zip(names, values))
+        yield source, config
+
+def _init_worker(name, size, engine, thumb, strip, strip_dt):
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    pg.init()
+    # pg.init traps SIGTERM, which the pool terminates its workers with
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    _worker.update(
+        scene = scenes.make_scene(name, size, engine),
+        surf = pg.Surface(size, 0, 32),
+        thumb = thumb,
+        times = [strip_dt * n for n in range(strip)],
+    )
+
+def _render(config):
+    scene = _worker['scene']
+    surf = _worker['surf']
+    thumb = _worker['thumb']
+    for attr, value in config.items():
+        setattr(scene.model, attr, value)
+    cell = pg.Surface((thumb[0] * len(_worker['times']), thumb[1]), 0, 32)
+    for index, frame_time in enumerate(_worker['times']):
+        surf.fill((0,0,0))
+        scene.draw(surf, frame_time)
+        cell.blit(pg.transform.smoothscale(surf, thumb), (thumb[0] * index, 0))
+    return pg.image.tobytes(cell, 'RGB')
+
+def label(source, config, varies):
+    values = [f'{attr}={config[attr]:g}' for attr in varies]
+    return ' '.join([source] + values if source else values)
+
+def sweep(name, size, args, base, engine='python', section=None, jobs=None):
+    """
+    Render every combination of `args.vary` over `base`, and over the
+    config files in `args.configs`, into contact sheets in `args.sweep`.
+    """
+    directory = Path(args.sweep)
+    directory.mkdir(parents=True, exist_ok=True)
+    varies = args.vary
+    configs = None
+    if args.configs:
+        configs = read_configs(args.configs, section or name, base)
+    combos = list(combinations(base, varies, configs))
+    labeled = [attr for attr, _ in varies]
+    fields = list(base) + [attr for attr in labeled if attr not in base]
+
+    pg.font.init()
+    # a misspelled attribute would only be set on the model, changing nothing
+    model = scenes.make_scene(name, size, engine).model
+    unknown = [attr for attr in labeled if not hasattr(model, attr)]
+    if unknown:
+        sys.exit(f'{name} has no attribute {", ".join(unknown)} to vary')
+    font = hud.font(max(args.thumb[1] // 10, 10))
+    thumb_width, thumb_height = args.thumb
+    cell_size = (thumb_width * args.strip, thumb_height)
+    label_height = font.get_linesize()
+    per_sheet = args.columns * args.rows
+    jobs = max(1, jobs or os.cpu_count())
+    chunksize = max(1, len(combos) // (jobs * 4))
+    initargs = (name, size, engine, args.thumb, args.strip, args.strip_dt)
+
+    start = time.perf_counter()
+    sheet = None
+    sheets = 0
+    index_path = directory / 'index.csv'
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(jobs, _init_worker, initargs) as pool, \
+            open(index_path, 'w', newline='') as index_file:
+        writer = csv.writer(index_file)
+        writer.writerow(['sheet', 'row', 'column', 'source'] + fields)
+        results = pool.imap(_render, [config for _, config in combos], chunksize)
+        for number, ((source, config), data) in enumerate(zip(combos, results)):
+            cell = number % per_sheet
+            if cell == 0:
+                if sheet is not None:
+                    pg.image.save(sheet, str(directory / f'sheet_{sheets - 1:04d}.png'))
+                rows = min(args.rows, -(-(len(combos) - number) // args.columns))
+                columns = min(args.columns, len(combos) - number)
+                sheet = pg.Surface((columns * cell_size[0],
+                                    rows * (cell_size[1] + label_height)))
+                sheets += 1
+            row, column = divmod(cell, args.columns)
+            x = column * cell_size[0]
+            y = row * (cell_size[1] + label_height)
+            sheet.blit(pg.image.frombuffer(data, cell_size, 'RGB'), (x, y))
+            text = label(source, config, labeled)
+            sheet.blit(font.render(text, True, (200, 200, 200)), (x + 2, y + cell_size[1]))
+            writer.writerow([f'sheet_{sheets - 1:04d}.png', row, column, source]
+                            + [config[attr] for attr in fields])
+        if sheet is not None:
+            pg.image.save(sheet, str(directory / f'sheet_{sheets - 1:04d}.png'))
+        # let the workers exit, instead of terminating them on the way out
+        pool.close()
+        pool.join()
+    elapsed = time.perf_counter() - start
+    print(f'{len(combos)} combinations into {sheets} sheets in {directory}'
+          f' in {elapsed:.2f}s ({len(combos) / elapsed:.2f} per second)')
@@ -0,0 +1,32 @@
+import os
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pytest
+
+import miniblackhole
+
+pg = miniblackhole.pg
+np = pytest.importorskip('numpy')
+
+@pytest.fixture
+def surf():
+    pg.init()
+    yield pg.Surface((800, 600))
+    pg.quit()
+
+@pytest.mark.parametrize('nstars', [-1, 0, 1])
+def test_no_stars_draws_nothing(surf, nstars):
+    blackhole = miniblackhole.ArrayBlackHole(nstars, surf.get_size())
+    assert blackhole.draw(1.5, surf) == []
+
+def test_growing_from_no_stars_matches_python(surf):
+    blackhole = miniblackhole.ArrayBlackHole(0, surf.get_size())
+    blackhole.draw(1.5, surf)
+    blackhole.nstars = 500
+    surf.fill((0,0,0))
+    blackhole.draw(1.5, surf)
+    drawn = pg.image.tobytes(surf, 'RGB')
+    surf.fill((0,0,0))
+    miniblackhole.BlackHole(500, surf.get_size()).draw(1.5, surf)
+    assert drawn == pg.image.tobytes(surf, 'RGB')
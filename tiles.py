@@ -0,0 +1,133 @@
+"""
+Tile parallel rasterization of a scene across processes.
+
+The screen is split into horizontal bands. Every worker process owns one
+band and its own copy of the scene, and draws the whole scene clipped to
+its band into a pixel buffer in shared memory. The main process only
+sends the state for the frame and presents the buffer.
+"""
+import contextlib
+import multiprocessing
+import os
+import signal
+import time
+
+from multiprocessing import shared_memory
+
+with contextlib.redirect_stdout(open(os.devnull,'w')):
+    import pygame as pg
+
+import scenes
+
+PIXEL_FORMAT = 'RGBX'
+
+def bands(size, count):
+    """
+    Split a screen of `size` into `count` horizontal bands.
+    """
+    width, height = size
+    count = max(1, min(count, height))
+    edges = [height * n // count for n in range(count + 1)]
+    return [pg.Rect(0, top, width, bottom - top) for top, bottom in zip(edges, edges[1:])]
+
+def model_state(model):
+    """
+    Public attributes of a scene model, which is all a worker needs to match
+    the main process' copy.
+    """
+    if isinstance(model, dict):
+        return dict(model)
+    return {attr: value for attr, value in vars(model).items() if not attr.startswith('_')}
+
+def _apply_state(model, state):
+    if isinstance(model, dict):
+        model.update(state)
+    else:
+        for attr, value in state.items():
+            setattr(model, attr, value)
+
+def _work(conn, shm_name, name, size, engine, band):
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    pg.init()
+    # pg.init traps SIGTERM, which the process is stopped with at exit
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    shm = shared_memory.SharedMemory(name=shm_name)
+    surf = pg.image.frombuffer(shm.buf, size, PIXEL_FORMAT)
+    surf.set_clip(band)
+    scene = scenes.make_scene(name, size, engine)
+    while True:
+        message = conn.recv()
+        if message is None:
+            break
+        state, args = message
+        _apply_state(scene.model, state)
+        start = time.perf_counter_ns()
+        surf.fill((0,0,0))
+        scene.draw(surf, *args)
+        conn.send((time.perf_counter_ns() - start) / 1e6)
+    del surf
+    shm.close()
+
+
+class TileRenderer:
+    """
+    Draw a scene with a pool of processes, one per band of the screen.
+    """
+
+    def __init__(self, name, size, workers, engine='python'):
+        width, height = size
+        self.size = size
+        self.bands = bands(size, workers)
+        self.shm = shared_memory.SharedMemory(create=True, size=width * height * 4)
+        self.surface = pg.image.frombuffer(self.shm.buf, size, PIXEL_FORMAT)
+        self.timings = [0] * len(self.bands)
+        self.totals = [0] * len(self.bands)
+        self.frames = 0
+        self.connections = []
+        self.processes = []
+        context = multiprocessing.get_context('spawn')
+        for band in self.bands:
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(
+                target = _work,
+                args = (child_conn, self.shm.name, name, size, engine, band),
+                daemon = True,
+            )
+            process.start()
+            self.connections.append(parent_conn)
+            self.processes.append(process)
+
+    def draw(self, surf, model, *args):
+        """
+        Draw the scene with the state of `model` and `args` for the scene's
+        draw, after time, and blit it to `surf`.
+        """
+        message = (model_state(model), args)
+        for conn in self.connections:
+            conn.send(message)
+        for index, conn in enumerate(self.connections):
+            self.timings[index] = conn.recv()
+            self.totals[index] += self.timings[index]
+        self.frames += 1
+        return surf.blit(self.surface, (0, 0))
+
+    def mean_timings(self):
+        """
+        Mean milliseconds per frame spent by each tile.
+        """
+        return [total / max(self.frames, 1) for total in self.totals]
+
+    def report(self):
+        lines = []
+        for band, mean in zip(self.bands, self.mean_timings()):
+            lines.append(f'tile y={band.top}-{band.bottom}: {mean:.2f} ms')
+        return '\n'.join(lines)
+
+    def close(self):
+        for conn in self.connections:
+            conn.send(None)
+        for process in self.processes:
+            process.join()
+        del self.surface
+        self.shm.close()
+        self.shm.unlink()
@@ -0,0 +1,278 @@
+"""
+Show several demos at once in a grid of tiles in one window, each tile
+drawing into its own subsurface on a schedule of per-tile rates and time
+budgets, with an overlay of what every tile costs.
+"""
+import argparse
+import contextlib
+import math
+import os
+import time
+
+with contextlib.redirect_stdout(open(os.devnull,'w')):
+    import pygame as pg
+
+import engine
+import hud
+import launcher
+
+# size the demos that draw at fixed coordinates were made for, they are
+# scaled from it to their tile
+FIXED_SIZES = {
+    'breaking_broke': (800, 600),
+    'lorenzattractor': (800, 600),
+}
+
+# demos that cover their whole surface and need no background
+COVERING = {'shatteredtunnel'}
+
+# frames between draws, 0 to draw only after the tile handled an event
+DEFAULT_RATES = {
+    'breaking_broke': 0,
+    'shatteredtunnel': 2,
+}
+
+def parse_setting(string):
+    name, sep, value = string.partition('=')
+    if not sep or name not in launcher.DEMOS:
+        raise argparse.ArgumentTypeError(f'expected DEMO=VALUE, got {string!r}')
+    return name, float(value)
+
+def grid(space, count, columns=None):
+    """
+    Rects of `count` cells in rows of `columns` filling `space`.
+    """
+    columns = columns or math.ceil(math.sqrt(count))
+    rows = math.ceil(count / columns)
+    width = space.width // columns
+    height = space.height // rows
+    return [pg.Rect(space.x + width * (index % columns),
+                    space.y + height * (index // columns), width, height)
+            for index in range(count)]
+
+
+class Tile:
+    """
+    Demo state drawn into a subsurface every `rate` frames, or only after it
+    handled an event when `rate` is 0. Drawing less often than that keeps
+    its mean cost within `budget` milliseconds per frame.
+    """
+
+    def __init__(self, name, state, surface, rate=1, budget=None, canvas=None):
+        self.name = name
+        self.state = state
+        self.surface = surface
+        self.rect = pg.Rect(surface.get_abs_offset(), surface.get_size())
+        self.rate = rate
+        self.budget = budget
+        # the native surface of a demo that is scaled to its tile
+        self.canvas = canvas
+        self.background = None if name in COVERING else (0,0,0)
+        self.changed = True
+        self.elapsed = 0
+        self.last = None
+        # moving average of the milliseconds of a draw, with its update
+        self.cost = 0
+        self.draws = 0
+        self.deferred = 0
+        self.total_ms = 0
+
+    def interval(self):
+        """
+        Frames between draws, from the rate and from the cost against the
+        budget.
+        """
+        interval = max(self.rate, 1)
+        if self.budget and self.cost > self.budget:
+            interval = max(interval, math.ceil(self.cost / self.budget))
+        return interval
+
+    def due(self, frame):
+        if self.changed or self.last is None:
+            return True
+        if not self.rate:
+            return False
+        return frame - self.last >= self.interval()
+
+    def lateness(self, frame):
+        if self.changed or self.last is None:
+            return math.inf
+        return (frame - self.last) / self.interval()
+
+    def run(self, frame, keys):
+        """
+        Update the state with the time since it last ran, draw it and
+        return the milliseconds it took.
+        """
+        start = time.perf_counter()
+        self.state.update(self.elapsed, keys)
+        self.elapsed = 0
+        surf = self.canvas or self.surface
+        if self.background is not None:
+            surf.fill(self.background)
+        self.state.draw(surf)
+        if hasattr(self.state, 'draw_hud'):
+            self.state.draw_hud(surf)
+        if self.canvas:
+            pg.transform.smoothscale(self.canvas, self.surface.get_size(), self.surface)
+        ms = (time.perf_counter() - start) * 1000
+        self.cost = ms if not self.draws else self.cost * .8 + ms * .2
+        self.draws += 1
+        self.total_ms += ms
+        self.last = frame
+        self.changed = False
+        return ms
+
+    def label(self):
+        every = f'every {self.interval()}' if self.rate else 'on change'
+        budget = f'/{self.budget:.1f}' if self.budget else ''
+        return f'{self.cost:.1f}{budget} ms, {every}, deferred {self.deferred}'
+
+
+class Wall:
+    """
+    State that runs a tile per demo. Each frame the tiles that are due draw,
+    the latest first, while the frame `budget` in milliseconds lasts, and at
+    least one does. Keys go to the tile that was clicked last.
+    """
+
+    def __init__(self, names, screen, clock, engine_name='python', columns=None, rates=None,
+                 budgets=None, budget=1000/60):
+        self.screen = screen
+        self.clock = clock
+        self.budget = budget
+        rates = dict(DEFAULT_RATES, **(rates or {}))
+        budgets = budgets or {}
+        self.tiles = []
+        for name, rect in zip(names, grid(screen.get_rect(), len(names), columns)):
+            surface = screen.subsurface(rect)
+            canvas = None
+            target = surface
+            if name in FIXED_SIZES:
+                canvas = pg.Surface(FIXED_SIZES[name], 0, screen)
+                target = canvas
+            state = launcher.DEMOS[name](target, clock, engine_name)
+            if canvas and hasattr(state, 'scale'):
+                # drawn straight into the tile at a scale instead
+                state.scale = min(rect.width / canvas.get_width(),
+                                  rect.height / canvas.get_height())
+                canvas = None
+            self.tiles.append(Tile(name, state, surface, int(rates.get(name, 1)),
+                                   budgets.get(name, budget / len(names)), canvas))
+        self.focus = self.tiles[0]
+        self.frame = 0
+        self.keys = None
+        self.idle_keys = None
+        self.overlay = True
+        self.overlay_tables = [hud.Table(hud.TextCache(), max(tile.rect.height // 24, 12),
+                                         (200, 200, 200), volatile=(tile.name,))
+                               for tile in self.tiles]
+
+    def handle(self, event):
+        if event.type == pg.MOUSEBUTTONDOWN:
+            for tile in self.tiles:
+                if tile.rect.collidepoint(event.pos):
+                    self.focus.changed = tile.changed = True
+                    self.focus = tile
+        elif event.type == pg.KEYDOWN and event.key == pg.K_F2:
+            self.overlay = not self.overlay
+            for tile in self.tiles:
+                tile.changed = True
+        else:
+            self.focus.state.handle(event)
+            if event.type in (pg.KEYDOWN, pg.KEYUP):
+                self.focus.changed = True
+
+    def update(self, ms, keys):
+        for tile in self.tiles:
+            tile.elapsed += ms
+        self.keys = keys
+        if self.idle_keys is None or len(self.idle_keys.pressed) != len(keys.pressed):
+            nothing = pg.key.ScancodeWrapper([False] * len(keys.pressed))
+            self.idle_keys = engine.KeyState(nothing, 0)
+
+    def draw(self, surf):
+        self.frame += 1
+        due = [tile for tile in self.tiles if tile.due(self.frame)]
+        due.sort(key=lambda tile: tile.lateness(self.frame), reverse=True)
+        spent = 0
+        drawn = []
+        for tile in due:
+            if drawn and spent + tile.cost > self.budget:
+                tile.deferred += 1
+                continue
+            keys = self.keys if tile is self.focus else self.idle_keys
+            spent += tile.run(self.frame, keys)
+            drawn.append(tile.rect)
+        return drawn
+
+    def draw_hud(self, surf):
+        if not self.overlay:
+            return []
+        drawn = []
+        for tile, table in zip(self.tiles, self.overlay_tables):
+            table.update([(tile.name, tile.label())])
+            if table.dirty:
+                table.compose()
+            # an opaque strip, tiles that were not drawn keep their pixels
+            strip = pg.Rect(tile.rect.left, tile.rect.bottom - table.image.get_height(),
+                            tile.rect.width, table.image.get_height())
+            surf.fill((0,0,0), strip)
+            table.draw(surf, bottomleft=tile.rect.bottomleft)
+            drawn.append(strip)
+        pg.draw.rect(surf, (200, 200, 0), self.focus.rect, 1)
+        drawn.append(self.focus.rect)
+        return drawn
+
+    def report(self):
+        lines = [f'{self.frame} frames']
+        for tile in self.tiles:
+            mean = tile.total_ms / tile.draws if tile.draws else 0
+            lines.append(f'{tile.name}: {tile.draws} draws, mean {mean:.2f} ms,'
+                         f' deferred {tile.deferred}')
+        return '\n'.join(lines)
+
+
+def main(argv=None):
+    """
+    Show several demos at once in a grid of tiles.
+    """
+    parser = argparse.ArgumentParser(prog='wall', description=main.__doc__)
+    parser.add_argument('demos', nargs='*', metavar='DEMO',
+                        help=f'Demos of the tiles, from {", ".join(launcher.DEMOS)}. [all]')
+    parser.add_argument('--xres', type=int, default=1200,
+                        help='Horizontal resolution. [%(default)s]')
+    parser.add_argument('--yres', type=int, default=800,
+                        help='Vertical resolution. [%(default)s]')
+    parser.add_argument('--fps', type=int, default=60,
+                        help='Frames per second, 0 for no limit. [%(default)s]')
+    parser.add_argument('--engine', choices=['python', 'numpy'], default='python',
+                        help='Engine of the demos that have one. [%(default)s]')
+    parser.add_argument('--columns', type=int,
+                        help='Tiles per row. [square grid]')
+    parser.add_argument('--rate', metavar='DEMO=FRAMES', type=parse_setting,
+                        action='append', default=[],
+                        help='Frames between draws of a demo, 0 to draw it only'
+                             ' when it handles an event. [breaking_broke=0,'
+                             ' shatteredtunnel=2, others 1]')
+    parser.add_argument('--budget', metavar='DEMO=MS', type=parse_setting,
+                        action='append', default=[],
+                        help='Milliseconds per frame a demo may take on average, it'
+                             ' is drawn less often when it takes more. [an equal'
+                             ' share of the frame]')
+    engine.add_arguments(parser)
+    args = parser.parse_args(argv)
+    for name in args.demos:
+        if name not in launcher.DEMOS:
+            parser.error(f'unknown demo {name!r}')
+    names = args.demos or list(launcher.DEMOS)
+    clock = engine.init(args)
+    screen = engine.set_mode(args, (args.xres, args.yres))
+    pg.display.set_caption('wall')
+    wall = Wall(names, screen, clock, args.engine, args.columns, dict(args.rate),
+                dict(args.budget), 1000 / (args.fps or 60))
+    engine.Engine.from_args(args, clock, screen, wall, background=None).run()
+    print(wall.report())
+
+if __name__ == '__main__':
+    main()